@@ -1,73 +1,229 @@
-import streamlit as st
 from collections import Counter
-from textblob import TextBlob
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-import nltk
-from groq import Groq
 import re
-from transformers import pipeline
+import json
+import threading
+import itertools
 import concurrent.futures
+import model_registry
+import diagnostics
+from llm_gateway import complete as llm_complete, get_backend
 
-nltk.download('vader_lexicon', quiet=True)
+# NumPy (via sampling) and the NLTK/TextBlob/transformers models are imported on first
+# use so importing this module stays cheap; model_registry checks NLTK data offline.
 
 class FeedbackAnalyzer:
-    def __init__(self, groq_api_key=None, use_roberta=False):
-        self.vader_analyzer = SentimentIntensityAnalyzer()
-        self.model = Groq(api_key=groq_api_key) if groq_api_key else None
+    def __init__(self, groq_api_key=None, use_roberta=False, roberta_batch_size=32,
+                 max_llm_concurrency=4, use_llm_cache=True, use_llm_boldify=False,
+                 use_analysis_bundle=False, summary_chunk_tokens=3000, sample_token_budget=1500,
+                 relevance_batch_tokens=1200, relevance_batch_max_items=40, model_tier=None,
+                 diagnostics_sink=None, roberta_backend="pytorch", roberta_cascade=False, cascade_margin=0.15,
+                 lexicon_workers=None, lexicon_parallel_min=20000, collapse_duplicates=True,
+                 use_sentiment_cache=True):
+        # Constructor arguments are all a worker process needs to rebuild this analyzer (see __getstate__)
+        self._init_args = {k: v for k, v in locals().items() if k not in ("self", "__class__")}
+        self.diagnostics_sink = diagnostics_sink
+        self.messages = diagnostics.Collector()
+        self.vader_analyzer = model_registry.get_vader_analyzer()
+        self.model = get_backend(groq_api_key)
         self.use_roberta = use_roberta
         self.roberta_analyzer = None
+        # "pytorch" runs the transformers pipeline, "onnx" the int8 ONNX Runtime export
+        self.roberta_backend = roberta_backend
+        self.roberta_batch_size = max(1, int(roberta_batch_size))
+        # Cascade: lexicon scores settle clear items, only borderline ones go to RoBERTa
+        self.roberta_cascade = roberta_cascade
+        self.cascade_margin = float(cascade_margin)
+        # Lexicon scoring moves to a process pool once a survey is large enough to pay for it
+        self.lexicon_workers = lexicon_workers
+        self.lexicon_parallel_min = int(lexicon_parallel_min)
+        # Repeated and near-identical answers are filtered, scored and prompted once, weighted by count
+        self.collapse_duplicates = collapse_duplicates
+        # Per-text scores persist across runs and events (see sentiment_cache.py)
+        self.use_sentiment_cache = use_sentiment_cache
+        self.max_llm_concurrency = max(1, int(max_llm_concurrency))
+        self.use_llm_cache = use_llm_cache
+        # None routes each stage by llm_gateway.STAGE_TIERS; "large" or "fast" pins every stage
+        self.model_tier = model_tier
+        self.use_llm_boldify = use_llm_boldify
+        self.use_analysis_bundle = use_analysis_bundle
+        self.summary_chunk_tokens = max(200, int(summary_chunk_tokens))
+        self.sample_token_budget = max(100, int(sample_token_budget))
+        self.relevance_batch_tokens = max(100, int(relevance_batch_tokens))
+        self.relevance_batch_max_items = max(1, int(relevance_batch_max_items))
+        self._sample_lock = threading.Lock()
+        self._sample_cache = None
+        self._prompt_weights = None
+        self._stats_lock = threading.Lock()
+        # Set while analyze_feedback runs so nested map steps share its workers (see _map_llm)
+        self._llm_executor = None
         
         if use_roberta:
             try:
-                self.roberta_analyzer = pipeline(
-                    "sentiment-analysis", 
-                    model="cardiffnlp/twitter-roberta-base-sentiment",
-                    top_k=None
-                )
+                if roberta_backend == "onnx":
+                    self.roberta_analyzer = model_registry.get_onnx_sentiment()
+                else:
+                    self.roberta_analyzer = model_registry.get_sentiment_pipeline(
+                        model_registry.ROBERTA_MODEL,
+                        top_k=None
+                    )
             except Exception as e:
-                st.error(f"Failed to initialize RoBERTa: {str(e)}")
+                self._emit("error", f"Failed to initialize RoBERTa: {str(e)}")
                 self.use_roberta = False
+        # Problems from loading are reported with every analysis; self.messages restarts per analysis
+        self._init_messages = list(self.messages)
+
+    def __getstate__(self):
+        # Models, the LLM client, locks and the caller's sink stay in their process; the
+        # receiver rebuilds the rest from the shared registries, which is cheap once warm
+        return {k: v for k, v in self._init_args.items() if k != "diagnostics_sink"}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _emit(self, level, message):
+        """Record a problem for the caller instead of touching any UI"""
+        self.messages(level, message)
+        diagnostics.emit(level, message, sink=self.diagnostics_sink)
 
     def analyze_feedback(self, feedback_list):
+        # A reused analyzer must not repeat the previous run's warnings
+        self.messages = diagnostics.Collector()
         if not feedback_list:
             return {"error": "No feedback data found"}
 
-        # Filter relevant feedback
-        relevant_feedback = self._filter_relevant_feedback(feedback_list)
-        
+        groups = self._group_duplicates(feedback_list)
+        # Filter relevant feedback; a group of duplicates is judged once
+        relevant_idx = self._relevant_indices(feedback_list, groups.item_keys() if groups else None)
+        relevant_feedback = [feedback_list[i] for i in relevant_idx]
+        prompt_feedback = relevant_feedback
+        dedup_stats = None
+        if groups is not None:
+            groups = groups.subset(relevant_idx)
+            # Prompts see each distinct answer once, tagged with how many attendees gave it
+            prompt_feedback = groups.with_counts(relevant_feedback)
+            self._prompt_weights = (prompt_feedback, groups.counts)
+            dedup_stats = groups.stats()
+            dedup_stats["sentiment_items_saved"] = len(relevant_feedback) - len(prompt_feedback)
+            dedup_stats["prompt_tokens_saved"] = (estimate_tokens("\n".join(relevant_feedback))
+                                                  - estimate_tokens("\n".join(prompt_feedback)))
+
+        # The four narrative stages are independent LLM round-trips, so run them side by side
+        # and do the local sentiment scoring while they are in flight.
+        stages = {
+            "key_themes": self._extract_key_themes,
+            "suggestions": self._extract_suggestions,
+            "narrative_summary": self._generate_narrative_summary,
+            "key_takeaways": self._extract_key_takeaways
+        }
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_llm_concurrency) as executor:
+            self._llm_executor = executor
+            try:
+                sections, sentiment_analysis = self._run_stages(executor, stages, prompt_feedback,
+                                                                relevant_feedback, groups)
+            finally:
+                self._llm_executor = None
+
         analysis_results = {
             "total_responses": len(feedback_list),
             "relevant_responses": len(relevant_feedback),
-            "sentiment_analysis": self._perform_sentiment_analysis(relevant_feedback),
-            "text_analysis": self._perform_text_analysis(relevant_feedback),
-            "suggestions": self._extract_suggestions(relevant_feedback),
-            "narrative_summary": self._generate_narrative_summary(relevant_feedback),
-            "key_takeaways": self._extract_key_takeaways(relevant_feedback)
+            "filter_stats": self.filter_stats,
+            "dedup": dedup_stats,
+            "sentiment_analysis": sentiment_analysis,
+            "text_analysis": self._perform_text_analysis(relevant_feedback, key_themes=sections["key_themes"]),
+            "suggestions": sections["suggestions"],
+            "narrative_summary": sections["narrative_summary"],
+            "key_takeaways": sections["key_takeaways"],
+            "diagnostics": self._init_messages + list(self.messages)
         }
         return analysis_results
 
-    def _filter_relevant_feedback(self, feedback_list):
-        """Filter out irrelevant/short feedback using LLM"""
+    def _run_stages(self, executor, stages, prompt_feedback, relevant_feedback, groups):
+        if self.use_analysis_bundle and self.model:
+            bundle = executor.submit(self._analyze_bundle, prompt_feedback)
+            sentiment_analysis = self._perform_sentiment_analysis(relevant_feedback, groups)
+            sections = bundle.result()
+            # Any section the bundle could not supply falls back to its own prompt
+            pending = {name: executor.submit(stage, prompt_feedback)
+                       for name, stage in stages.items() if name not in sections}
+        else:
+            sections = {}
+            pending = {name: executor.submit(stage, prompt_feedback) for name, stage in stages.items()}
+            sentiment_analysis = self._perform_sentiment_analysis(relevant_feedback, groups)
+        sections.update({name: future.result() for name, future in pending.items()})
+        return sections, sentiment_analysis
+
+    def _map_llm(self, fn, items):
+        """``fn`` over ``items`` in order, never more than ``max_llm_concurrency`` calls in flight.
+
+        Inside analyze_feedback the work goes to the stage pool instead of a second one.
+        The calling stage holds a worker of that pool, so it runs any item still queued
+        itself rather than wait on it: no deadlock with one worker, no extra calls with many.
+        """
+        executor = self._llm_executor
+        if executor is None:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_llm_concurrency) as executor:
+                return list(executor.map(fn, items))
+        futures = [executor.submit(fn, item) for item in items]
+        return [fn(item) if future.cancel() else future.result() for future, item in zip(futures, items)]
+
+    def _group_duplicates(self, feedback_list):
+        """Exact and near-duplicate groups of ``feedback_list``, or None when collapsing is off"""
+        if not self.collapse_duplicates:
+            return None
+        from dedup import group_duplicates
+        return group_duplicates(feedback_list, normalize_feedback)
+
+    def _filter_relevant_feedback(self, feedback_list, keys=None):
+        """Filter out irrelevant/short feedback: local rules settle clear cases, the LLM only sees the rest"""
+        return [feedback_list[i] for i in self._relevant_indices(feedback_list, keys)]
+
+    def _relevant_indices(self, feedback_list, keys=None):
+        """Indices of the relevant feedback; items sharing a key (see normalize_feedback) get one verdict"""
+        self.filter_stats = {
+            "rules_relevant": 0, "rules_irrelevant": 0, "duplicates": 0,
+            "llm_decided": 0, "llm_calls": 0, "llm_calls_saved": 0, "llm_failed_batches": 0
+        }
         if not self.model or len(feedback_list) < 20:
-            return feedback_list
-            
-        chunk_size = 20
-        chunks = [feedback_list[i:i + chunk_size] 
-                 for i in range(0, len(feedback_list), chunk_size)]
-        
-        relevant_feedback = []
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = []
-            for chunk in chunks:
-                futures.append(executor.submit(
-                    self._filter_chunk_relevance, 
-                    chunk
-                ))
-            
-            for future in concurrent.futures.as_completed(futures):
-                relevant_feedback.extend(future.result())
-                
-        return relevant_feedback or feedback_list
+            return list(range(len(feedback_list)))
+
+        keys = keys or [normalize_feedback(fb) for fb in feedback_list]
+        decisions = {}
+        ambiguous = {}
+        for key, feedback in zip(keys, feedback_list):
+            if key in decisions or key in ambiguous:
+                self.filter_stats["duplicates"] += 1
+                continue
+            verdict = classify_relevance_locally(key)
+            if verdict is None:
+                ambiguous[key] = feedback
+            else:
+                decisions[key] = verdict
+                self.filter_stats["rules_relevant" if verdict else "rules_irrelevant"] += 1
+
+        # Pack ambiguous items into batches by token count rather than a fixed item count
+        batches = chunk_by_tokens(list(ambiguous.values()), self.relevance_batch_tokens,
+                                  max_items=self.relevance_batch_max_items, truncate=False)
+        if batches:
+            relevant = set(self._filter_with_llm(batches))
+            decisions.update({key: feedback in relevant for key, feedback in ambiguous.items()})
+
+        self.filter_stats["llm_decided"] = len(ambiguous)
+        self.filter_stats["llm_calls"] = len(batches)
+        # Baseline: the original fixed chunks of 20 over every item
+        self.filter_stats["llm_calls_saved"] = -(-len(feedback_list) // 20) - len(batches)
+
+        relevant_idx = [idx for idx, key in enumerate(keys) if decisions[key]]
+        return relevant_idx or list(range(len(feedback_list)))
+
+    def _filter_with_llm(self, batches):
+        """Classify feedback relevance with the LLM, keeping the input order.
+
+        At most ``max_llm_concurrency`` batches are in flight at once so the fan-out
+        stays inside Groq's rate limits.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_llm_concurrency) as executor:
+            results = executor.map(self._filter_chunk_relevance, batches)
+            return [fb for relevant in results for fb in relevant]
 
     def _filter_chunk_relevance(self, chunk):
         combined = "\n".join([f"{idx+1}. {fb}" for idx, fb in enumerate(chunk)])
@@ -86,17 +242,24 @@ Feedback:
 {combined}
 """
         try:
-            response = self.model.chat.completions.create(
-                model="llama3-70b-8192",
+            response = llm_complete(
+                self.model,
+                tier=self.model_tier,
                 messages=[{"role": "user", "content": prompt}],
-                temperature=0.1
+                stage="relevance",
+                use_cache=self.use_llm_cache,
+                temperature=0.1,
+                max_tokens=2 * len(chunk) + 8  # one digit and a comma per item
             )
-            classifications = response.choices[0].message.content.strip().split(',')
+            classifications = response.strip().split(',')
             return [
                 fb for idx, fb in enumerate(chunk) 
-                if idx < len(classifications) and classifications[idx] == '1'
+                if idx < len(classifications) and classifications[idx].strip() == '1'
             ]
-        except:
+        except Exception:
+            # Keep the batch rather than drop real feedback, but make the failure visible
+            with self._stats_lock:
+                self.filter_stats["llm_failed_batches"] += 1
             return chunk
 
     def professionalize_text(self, text):
@@ -118,12 +281,14 @@ TEXT:
         """.strip()
 
         try:
-            response = self.model.chat.completions.create(
-                model="llama3-70b-8192",
+            result = llm_complete(
+                self.model,
+                tier=self.model_tier,
                 messages=[{"role": "user", "content": prompt}],
+                stage="professionalize",
+                use_cache=self.use_llm_cache,
                 temperature=0.3
-            )
-            result = response.choices[0].message.content.strip()
+            ).strip()
 
             # Remove unwanted helper or echo phrases (case-insensitive)
             bad_phrases = [
@@ -143,7 +308,7 @@ TEXT:
             return result
 
         except Exception as e:
-            st.error(f"Error professionalizing text: {e}")
+            self._emit("error", f"Error professionalizing text: {e}")
             return text.strip()
 
     # ** CORRECTION STARTS HERE **
@@ -170,83 +335,108 @@ RAW NOTES:
 {mentions_text.strip()}
 """
         try:
-            response = self.model.chat.completions.create(
-                model="llama3-70b-8192",
+            return llm_complete(
+                self.model,
+                tier=self.model_tier,
                 messages=[{"role": "user", "content": prompt}],
+                stage="mentions",
+                use_cache=self.use_llm_cache,
                 temperature=0.4
-            )
-            return response.choices[0].message.content.strip()
+            ).strip()
         except Exception as e:
-            st.error(f"Error professionalizing mentions: {e}")
+            self._emit("error", f"Error professionalizing mentions: {e}")
             # Fallback to a simple bulleted list
             return "- " + "\n- ".join(mentions_text.strip().splitlines())
     # ** CORRECTION ENDS HERE **
-    
-    def _perform_sentiment_analysis(self, feedback_list):
-        sentiments = {"positive": 0, "negative": 0, "neutral": 0, "scores": [], "detailed_analysis": []}
-        
-        for feedback in feedback_list:
-            if self.use_roberta and self.roberta_analyzer:
-                try:
-                    roberta_result = self.roberta_analyzer(feedback)[0]
-                    roberta_sentiment = max(roberta_result, key=lambda x: x['score'])
-                    
-                    if roberta_sentiment['label'] == 'LABEL_2':
-                        sentiment = "positive"
-                        sentiments["positive"] += 1
-                    elif roberta_sentiment['label'] == 'LABEL_0':
-                        sentiment = "negative"
-                        sentiments["negative"] += 1
-                    else:
-                        sentiment = "neutral"
-                        sentiments["neutral"] += 1
-                    
-                    sentiments["scores"].append({
-                        "text": feedback,
-                        "roberta_label": roberta_sentiment['label'],
-                        "roberta_score": roberta_sentiment['score'],
-                        "sentiment": sentiment
-                    })
-                    
-                    sentiments["detailed_analysis"].append({
-                        "feedback": feedback,
-                        "sentiment": sentiment,
-                        "confidence": roberta_sentiment['score']
-                    })
+
+    def _run_roberta_batched(self, feedback_list):
+        """Score feedback with RoBERTa in length-bucketed batches.
+
+        Items are sorted by length so each batch pads to a similar size, then the
+        top label per item is returned keyed by its index in ``feedback_list``.
+        When a batch fails its items are retried one at a time; only the items
+        that still fail are left out, so the caller falls back to VADER for them.
+        """
+        order = sorted(range(len(feedback_list)), key=lambda i: len(feedback_list[i]))
+        results = {}
+        for start in range(0, len(order), self.roberta_batch_size):
+            batch_idx = order[start:start + self.roberta_batch_size]
+            batch = [feedback_list[i] for i in batch_idx]
+            try:
+                outputs = self._roberta_outputs(batch)
+            except Exception as e:
+                # Long responses sort into the same batch, so one bad item must not sink the rest
+                outputs = []
+                for text in batch:
+                    try:
+                        outputs.extend(self._roberta_outputs([text]))
+                    except Exception:
+                        outputs.append(None)
+                failed = outputs.count(None)
+                self._emit("warning", f"RoBERTa analysis failed for {failed} of {len(batch)} items "
+                                      f"in a batch, using VADER for them: {str(e)}")
+            for i, output in zip(batch_idx, outputs):
+                if output is None:
                     continue
-                except Exception as e:
-                    st.warning(f"RoBERTa analysis failed: {str(e)}")
-            
-            # Fallback to VADER + TextBlob
-            vader_scores = self.vader_analyzer.polarity_scores(feedback)
-            blob = TextBlob(feedback)
-            textblob_polarity = blob.sentiment.polarity
-
-            # ** CORRECTION STARTS HERE **
-            # Make thresholds stricter to classify weakly positive/negative comments (potentially sarcastic) as neutral.
-            if vader_scores['compound'] >= 0.4 and textblob_polarity > 0.2:
-                sentiment = "positive"
-                sentiments["positive"] += 1
-            elif vader_scores['compound'] <= -0.4 or textblob_polarity < -0.2:
-                sentiment = "negative"
-                sentiments["negative"] += 1
-            else:
-                sentiment = "neutral"
-                sentiments["neutral"] += 1
-            # ** CORRECTION ENDS HERE **
-
-            sentiments["scores"].append({
-                "text": feedback,
-                "vader_compound": vader_scores['compound'],
-                "textblob_polarity": textblob_polarity,
-                "sentiment": sentiment
-            })
-
-            sentiments["detailed_analysis"].append({
-                "feedback": feedback,
-                "sentiment": sentiment,
-                "confidence": abs(vader_scores['compound'])
-            })
+                if isinstance(output, dict):
+                    output = [output]
+                results[i] = max(output, key=lambda x: x['score'])
+        return results
+
+    def _roberta_outputs(self, texts):
+        # max_length is explicit: truncation=True alone trusts the tokenizer's model_max_length
+        return self.roberta_analyzer(texts, batch_size=len(texts), truncation=True, max_length=ROBERTA_MAX_LENGTH)
+
+    def _perform_sentiment_analysis(self, feedback_list, groups=None):
+        from sentiment_store import SentimentResults
+
+        sentiments = {"positive": 0, "negative": 0, "neutral": 0}
+        # Per-item results are columnar; "scores"/"detailed_analysis" below are views over it
+        results = SentimentResults(feedback_list)
+        # With duplicate groups only one text per group is scored and every member takes its result
+        unique = feedback_list if groups is None else groups.unique(feedback_list)
+        group_of = range(len(feedback_list)) if groups is None else groups.group_of
+
+        roberta_results = {}
+        lexicon_scores = {}
+        if not (self.use_roberta and self.roberta_analyzer) or self.roberta_cascade:
+            lexicon_scores = self._score_lexicon_cached(unique)
+
+        if self.use_roberta and self.roberta_analyzer and self.roberta_cascade:
+            escalated = [idx for idx, (compound, polarity) in lexicon_scores.items()
+                         if needs_escalation(compound, polarity, self.cascade_margin)]
+            batch_results = self._run_roberta_cached([unique[idx] for idx in escalated])
+            roberta_results = {escalated[i]: result for i, result in batch_results.items()}
+            sentiments["cascade"] = {
+                "escalated": len(escalated),
+                "escalation_rate": len(escalated) / len(unique) if unique else 0.0
+            }
+        elif self.use_roberta and self.roberta_analyzer:
+            roberta_results = self._run_roberta_cached(unique)
+
+        for idx, group in enumerate(group_of):
+            roberta_sentiment = roberta_results.get(group)
+            if roberta_sentiment is not None:
+                if roberta_sentiment['label'] == 'LABEL_2':
+                    sentiment = "positive"
+                    sentiments["positive"] += 1
+                elif roberta_sentiment['label'] == 'LABEL_0':
+                    sentiment = "negative"
+                    sentiments["negative"] += 1
+                else:
+                    sentiment = "neutral"
+                    sentiments["neutral"] += 1
+
+                results.set_roberta(idx, roberta_sentiment['label'], roberta_sentiment['score'], sentiment)
+                continue
+
+            # Fallback to VADER + TextBlob (already scored unless RoBERTa was expected to cover it)
+            if group not in lexicon_scores:
+                lexicon_scores[group] = self._lexicon_scores(unique[group])
+            vader_compound, textblob_polarity = lexicon_scores[group]
+            sentiment = classify_lexicon(vader_compound, textblob_polarity)
+            sentiments[sentiment] += 1
+            results.set_lexicon(idx, vader_compound, textblob_polarity, sentiment)
 
         total = len(feedback_list)
         sentiments["percentages"] = {
@@ -257,29 +447,149 @@ RAW NOTES:
         sentiments["overall_score"] = round(
             (1 * sentiments["positive"] + 0 * sentiments["neutral"] + (-1) * sentiments["negative"]) / total, 2
         ) if total > 0 else 0
+        sentiments["results"] = results
+        sentiments["scores"] = results.scores
+        sentiments["detailed_analysis"] = results.detailed_analysis
 
         return sentiments
 
-    def _perform_text_analysis(self, feedback_list):
-        all_text = " ".join(feedback_list)
-        clean_text = re.sub(r'[^\w\s]', '', all_text.lower())
-        words = clean_text.split()
-        stop_words = set(["the", "a", "an", "and", "or", "in", "on", "at", "to", "for", "of", "with", "by", "is", "was", "are", "were"])
-        filtered_words = [word for word in words if word not in stop_words and len(word) > 2]
-        word_freq = Counter(filtered_words)
-        
-        # Extract key themes using LLM
-        key_themes = self._extract_key_themes(feedback_list)
-        
+    def _score_lexicon_cached(self, texts):
+        """{position: (VADER compound, TextBlob polarity)}, reusing scores stored by earlier runs"""
+        from sentiment_cache import lexicon_scorer
+        return self._with_sentiment_cache(
+            lexicon_scorer(), texts,
+            lambda misses: dict(enumerate(self._score_lexicon_all(misses)))
+        )
+
+    def _run_roberta_cached(self, texts):
+        """{position: top RoBERTa label and score}, reusing scores stored by earlier runs"""
+        from sentiment_cache import roberta_scorer
+        return self._with_sentiment_cache(
+            roberta_scorer(model_registry.ROBERTA_MODEL, self.roberta_backend), texts,
+            lambda misses: {idx: {"label": result["label"], "score": float(result["score"])}
+                            for idx, result in self._run_roberta_batched(misses).items()}
+        )
+
+    def _with_sentiment_cache(self, scorer, texts, score):
+        """``score(texts)`` as {position: value}, with only the cache misses actually scored"""
+        if not self.use_sentiment_cache:
+            return score(texts)
+        from sentiment_cache import get_sentiment_cache
+        cache = get_sentiment_cache()
+        values = cache.get_many(scorer, texts)
+        missing = [idx for idx in range(len(texts)) if idx not in values]
+        if missing:
+            pending = list(dict.fromkeys(texts[idx] for idx in missing))  # repeats are scored once
+            scored = {pending[i]: value for i, value in score(pending).items()}
+            cache.put_many(scorer, scored.items())
+            values.update({idx: scored[texts[idx]] for idx in missing if texts[idx] in scored})
+        return {idx: values[idx] for idx in range(len(texts)) if idx in values}
+
+    def _lexicon_scores(self, feedback):
+        """(VADER compound, TextBlob polarity) for one item"""
+        # Same polarity as TextBlob(feedback).sentiment without building a blob per item
+        pattern = model_registry.get_textblob_analyzer()
+        return self.vader_analyzer.polarity_scores(feedback)['compound'], pattern.analyze(feedback).polarity
+
+    def _score_lexicon_all(self, feedback_list):
+        """Lexicon scores for every item, in order; sharded across processes for very large inputs"""
+        if len(feedback_list) >= self.lexicon_parallel_min:
+            import parallel_sentiment
+            workers = self.lexicon_workers or parallel_sentiment.default_workers()
+            if workers > 1:
+                try:
+                    return parallel_sentiment.score_lexicon(feedback_list, workers)
+                except Exception as e:
+                    self._emit("warning", f"Parallel sentiment scoring failed, scoring in this process: {e}")
+        return [self._lexicon_scores(feedback) for feedback in feedback_list]
+
+    def _perform_text_analysis(self, feedback_list, key_themes=None):
+        # One pass over the responses; no joined copy of the whole survey is built
+        stats = TextStats()
+        stats.update(tokenize_feedback(feedback_list))
+
+        # Extract key themes using LLM unless the caller already has them
+        if key_themes is None:
+            key_themes = self._extract_key_themes(feedback_list)
+
         return {
-            "total_words": len(words),
-            "unique_words": len(set(words)),
-            "most_common_words": word_freq.most_common(20),
+            "total_words": stats.total_words,
+            "unique_words": len(stats.vocabulary),
+            "most_common_words": stats.most_common(1, 20),
+            "most_common_bigrams": stats.most_common(2, 10),
+            "most_common_trigrams": stats.most_common(3, 10),
             "key_themes": key_themes
         }
 
+    def _analyze_bundle(self, feedback_list):
+        """Request all four narrative sections in one JSON completion.
+
+        Returns the sections that parsed and validated, rendered in the same Markdown
+        layout as the per-section prompts; missing sections are left for the caller.
+        """
+        combined_feedback = self._join_feedback(feedback_list)
+        prompt = f"""
+You are the club's Event Manager. Analyze the attendee feedback below and return ONE JSON object that matches this schema exactly:
+
+{ANALYSIS_BUNDLE_SCHEMA}
+
+Guidelines:
+- "key_themes": 3-5 themes, each with a short title, a brief description and its sentiment (Positive, Neutral or Negative).
+- "suggestions": the top 5 actionable suggestions grouped under your own theme headings, most frequent first, one implementable sentence each.
+- "narrative_summary": one paragraph for club leadership and sponsors stating the overall sentiment, the two strongest aspects of the event and any repeated patterns.
+- "key_takeaways": two "key_wins" and two "next_steps", each with a theme name and one sentence.
+
+Return ONLY the JSON object, with no Markdown fences or commentary.
+
+FEEDBACK:
+{combined_feedback}
+"""
+        try:
+            raw = llm_complete(
+                self.model,
+                tier=self.model_tier,
+                messages=[{"role": "user", "content": prompt}],
+                stage="analysis_bundle",
+                use_cache=self.use_llm_cache,
+                response_format={"type": "json_object"}
+            )
+        except Exception as e:
+            self._emit("warning", f"Combined analysis request failed, using per-section prompts: {e}")
+            return {}
+        return render_analysis_bundle(parse_json_object(raw))
+
+    def _representative_sample(self, feedback_list):
+        """Diverse, cluster-weighted subset of feedback that fits ``sample_token_budget``.
+
+        The stages run concurrently on the same list, so the sample is computed once and shared.
+        """
+        with self._sample_lock:
+            if self._sample_cache and self._sample_cache[0] is feedback_list:
+                return self._sample_cache[1]
+            from sampling import select_representatives
+            weights = None
+            if self._prompt_weights and self._prompt_weights[0] is feedback_list:
+                weights = self._prompt_weights[1]
+            sample = select_representatives(feedback_list, token_budget=self.sample_token_budget, weights=weights)
+            self._sample_cache = (feedback_list, sample)
+            return sample
+
+    def _join_feedback(self, items):
+        """Prompt text for ``items``, explaining the "(xN)" counts when duplicates are collapsed"""
+        text = "\n".join(items)
+        return f"{COUNT_NOTE}\n{text}" if self.collapse_duplicates else text
+
+    def _boldify(self, text):
+        """Apply Markdown emphasis locally, or via the LLM when ``use_llm_boldify`` is set"""
+        if self.use_llm_boldify and self.model:
+            try:
+                return boldify_with_llm(text, self.model, use_cache=self.use_llm_cache, tier=self.model_tier)
+            except Exception as e:
+                self._emit("warning", f"LLM formatting failed, using local formatting: {e}")
+        return format_emphasis(text)
+
     def _extract_key_themes(self, feedback_list):
-        combined_feedback = "\n".join(feedback_list[:50])
+        combined_feedback = self._join_feedback(self._representative_sample(feedback_list))
         prompt = f"""
 Identify 3-5 key themes from this feedback. For each theme:
 - Provide a short descriptive title
@@ -298,16 +608,19 @@ If you want any word or heading to appear bold, start it with ** and end it with
 Do not include any introductory or summary lines. Do not include any output or unnecessary lines like "Here is what you asked for" or similar. Only output the requested content in the specified format.
 """
         try:
-            raw = self.model.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=[{"role": "user", "content": prompt}]
-            ).choices[0].message.content
-            return boldify_with_llm(raw, self.model)
+            raw = llm_complete(
+                self.model,
+                tier=self.model_tier,
+                messages=[{"role": "user", "content": prompt}],
+                stage="key_themes",
+                use_cache=self.use_llm_cache
+            )
+            return self._boldify(raw)
         except Exception as e:
             return f"Error extracting key themes: {e}"
 
     def _extract_suggestions(self, feedback_list):
-        combined_feedback = "\n".join(feedback_list[:50])
+        combined_feedback = self._join_feedback(self._representative_sample(feedback_list))
         prompt = f"""
 You are the club's Event Manager. Review the attendee feedback below and surface the top 5 actionable suggestions.
 
@@ -325,16 +638,69 @@ Do not include any introductory or summary lines. Do not include any output or u
 """
 
         try:
-            raw = self.model.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=[{"role": "user", "content": prompt}]
-            ).choices[0].message.content
-            return boldify_with_llm(raw, self.model)
+            raw = llm_complete(
+                self.model,
+                tier=self.model_tier,
+                messages=[{"role": "user", "content": prompt}],
+                stage="suggestions",
+                use_cache=self.use_llm_cache
+            )
+            return self._boldify(raw)
         except Exception as e:
             return f"Error extracting suggestions: {e}"
 
+    def _summarize_chunk_or_raw(self, chunk, max_tokens):
+        """Notes for one chunk; if its request fails, the chunk's own text cut to ``max_tokens``"""
+        try:
+            return self._summarize_chunk(chunk)
+        except Exception as e:
+            self._emit("warning", f"Summarizing a feedback chunk failed, using its text as is: {e}")
+            return self._join_feedback(chunk)[:max_tokens * 4]
+
+    def _summarize_chunk(self, chunk):
+        combined_feedback = self._join_feedback(chunk)
+        prompt = f"""
+Condense the event feedback below into at most 8 short bullet notes for a later summary.
+Cover the overall sentiment, the aspects that were praised, the complaints, and any patterns that came up repeatedly.
+Where several responses say the same thing, note roughly how many (e.g. "(~12 responses)").
+Return ONLY the bullet notes, one per line, starting with '- '.
+
+FEEDBACK:
+{combined_feedback}
+"""
+        return llm_complete(
+            self.model,
+            tier=self.model_tier,
+            messages=[{"role": "user", "content": prompt}],
+            stage="chunk_summary",
+            use_cache=self.use_llm_cache
+        ).strip()
+
+    def _condense_feedback(self, feedback_list, max_rounds=4):
+        """Map-reduce feedback into notes that fit one prompt of ``summary_chunk_tokens``.
+
+        Each round summarizes token-budgeted chunks in parallel, so the number of
+        rounds (and the latency) grows with the logarithm of the feedback volume.
+        A chunk whose request fails keeps its raw text, cut to its share of the
+        budget, so one bad request does not cost the whole summary.
+        """
+        items = feedback_list
+        for _ in range(max_rounds):
+            total_tokens = estimate_tokens("\n".join(items))
+            if total_tokens <= self.summary_chunk_tokens:
+                break
+            chunks = chunk_by_tokens(items, self.summary_chunk_tokens)
+            share = max(50, self.summary_chunk_tokens // len(chunks))
+            items = self._map_llm(lambda chunk: self._summarize_chunk_or_raw(chunk, share), chunks)
+            if estimate_tokens("\n".join(items)) >= total_tokens:
+                break  # the notes are not getting any shorter
+        return items
+
     def _generate_narrative_summary(self, feedback_list):
-        full_text = "\n".join(feedback_list)
+        try:
+            full_text = self._join_feedback(self._condense_feedback(feedback_list))
+        except Exception as e:
+            return f"Error generating narrative summary: {e}"
         prompt = f"""
 You're the club's Event Manager preparing a one‑paragraph wrap‑up for club leadership and sponsors. From the feedback below:
 
@@ -353,16 +719,19 @@ Do not include any introductory or summary lines. Do not include any output or u
 """
 
         try:
-            raw = self.model.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=[{"role": "user", "content": prompt}]
-            ).choices[0].message.content
-            return boldify_with_llm(raw, self.model)
+            raw = llm_complete(
+                self.model,
+                tier=self.model_tier,
+                messages=[{"role": "user", "content": prompt}],
+                stage="narrative_summary",
+                use_cache=self.use_llm_cache
+            )
+            return self._boldify(raw)
         except Exception as e:
             return f"Error generating narrative summary: {e}"
 
     def _extract_key_takeaways(self, feedback_list):
-        combined_feedback = "\n".join(feedback_list[:50])
+        combined_feedback = self._join_feedback(self._representative_sample(feedback_list))
         prompt = f"""
 You are the club's Event Manager. Using the feedback below, generate a "Key Takeaways" section in the following format:
 
@@ -383,15 +752,335 @@ Do not include any introductory or summary lines. Do not include any output or u
 """
 
         try:
-            raw = self.model.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=[{"role": "user", "content": prompt}]
-            ).choices[0].message.content
-            return boldify_with_llm(raw, self.model)
+            raw = llm_complete(
+                self.model,
+                tier=self.model_tier,
+                messages=[{"role": "user", "content": prompt}],
+                stage="key_takeaways",
+                use_cache=self.use_llm_cache
+            )
+            return self._boldify(raw)
         except:
             return "Key takeaways analysis unavailable"
-    
-def boldify_with_llm(text, model):
+
+
+# ========== ROBERTA ========== #
+ROBERTA_MAX_LENGTH = 512  # tokens; RoBERTa's position limit, as in onnx_sentiment.py
+
+
+# ========== LEXICON SENTIMENT ========== #
+COMPOUND_THRESHOLD = 0.4
+POLARITY_THRESHOLD = 0.2
+
+
+def classify_lexicon(compound, polarity):
+    """Positive/negative/neutral from VADER compound and TextBlob polarity"""
+    # Strict thresholds so weakly positive/negative (potentially sarcastic) comments count as neutral
+    if compound >= COMPOUND_THRESHOLD and polarity > POLARITY_THRESHOLD:
+        return "positive"
+    if compound <= -COMPOUND_THRESHOLD or polarity < -POLARITY_THRESHOLD:
+        return "negative"
+    return "neutral"
+
+
+def needs_escalation(compound, polarity, margin=0.15):
+    """True when the lexicon verdict is unreliable: a score sits near a threshold or the scorers disagree.
+
+    ``margin`` is the band around the compound threshold; the polarity band is scaled by
+    the ratio of the two thresholds.
+    """
+    polarity_margin = margin * POLARITY_THRESHOLD / COMPOUND_THRESHOLD
+    if abs(abs(compound) - COMPOUND_THRESHOLD) < margin or abs(abs(polarity) - POLARITY_THRESHOLD) < polarity_margin:
+        return True
+    # Opposite signs, e.g. "great, another two-hour lecture"
+    return (compound >= 0.05 and polarity <= -0.05) or (compound <= -0.05 and polarity >= 0.05)
+
+
+# ========== RELEVANCE PRE-FILTER ========== #
+_NON_WORD_RE = re.compile(r"[^\w\s']+")
+_WHITESPACE_RE = re.compile(r"\s+")
+_HAS_ALPHA_RE = re.compile(r"[^\W\d_]")
+
+# Answers the relevance prompt itself lists as irrelevant
+IRRELEVANT_PHRASES = {
+    "ok", "okay", "k", "no", "nope", "none", "nil", "na", "n a", "nothing", "nothing much",
+    "no comments", "no comment", "no suggestions", "no suggestion", "no feedback", "nothing to say",
+    "not applicable", "yes", "yeah", "fine", "hmm", "idk", "dont know", "don't know", "test"
+}
+# Short sentiment words the prompt explicitly counts as relevant
+SENTIMENT_WORDS = {
+    "good", "great", "bad", "worst", "best", "nice", "awesome", "amazing", "excellent", "boring",
+    "poor", "helpful", "informative", "useful", "useless", "interesting", "fantastic", "terrible",
+    "loved", "love", "enjoyed", "wonderful", "superb", "outstanding", "disappointing", "average"
+}
+
+
+# Prepended to prompt feedback when duplicate answers are collapsed into one line
+COUNT_NOTE = 'An answer ending in "(xN)" was given by N attendees; weigh it accordingly.'
+
+
+def normalize_feedback(text):
+    """Lowercase, drop punctuation and collapse whitespace so trivially different answers compare equal"""
+    return _WHITESPACE_RE.sub(" ", _NON_WORD_RE.sub(" ", text.lower())).strip()
+
+
+def classify_relevance_locally(normalized):
+    """True/False for clear-cut feedback, None when the LLM has to decide"""
+    if not normalized or not _HAS_ALPHA_RE.search(normalized) or normalized in IRRELEVANT_PHRASES:
+        return False
+    words = normalized.split()
+    if len(words) <= 3 and any(word in SENTIMENT_WORDS for word in words):
+        return True
+    if len(words) == 1:
+        return False
+    if len(words) >= 8:
+        return True
+    return None
+
+
+# ========== TEXT ANALYTICS ========== #
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+STOP_WORDS = frozenset(["the", "a", "an", "and", "or", "in", "on", "at", "to", "for", "of", "with", "by", "is", "was", "are", "were"])
+
+
+def tokenize_feedback(feedback_iterable):
+    """Yield the lowercase, punctuation-free words of each response, one list per response"""
+    for feedback in feedback_iterable:
+        yield _PUNCTUATION_RE.sub('', feedback.lower()).split()
+
+
+class TextStats:
+    """Word totals, vocabulary and 1-3 word phrase counts, updated from a stream of responses.
+
+    Single words skip stop words and words of two letters or fewer. Phrases are
+    consecutive words as written, kept only when they start and end with such a
+    content word ("back was bad", never "sound back"), and never span two
+    responses. Word counts are exact and
+    grow with the vocabulary, not the input. The phrase counters are pruned of
+    their rarest entries once they pass ``max_phrases``, so memory stays bounded
+    on very large surveys while the frequent phrases keep their counts.
+    """
+
+    def __init__(self, max_phrases=100000, chunk_size=1024):
+        self.total_words = 0
+        self.vocabulary = set()
+        self.counters = {1: Counter(), 2: Counter(), 3: Counter()}
+        self.max_phrases = max_phrases
+        self.chunk_size = chunk_size
+
+    def update(self, word_lists):
+        """Add responses from an iterable of word lists, holding at most ``chunk_size`` of them at a time"""
+        word_lists = iter(word_lists)
+        while True:
+            chunk = list(itertools.islice(word_lists, self.chunk_size))
+            if not chunk:
+                return
+            unigrams, bigrams, trigrams = [], [], []
+            for words in chunk:
+                self.total_words += len(words)
+                self.vocabulary.update(words)
+                content = [i for i, word in enumerate(words) if word not in STOP_WORDS and len(word) > 2]
+                if not content:
+                    continue
+                unigrams.extend([words[i] for i in content])
+                # A phrase starting at a content word counts when its last word is one too
+                ends = set(content)
+                bigrams.extend([(words[i], words[i + 1]) for i in content if i + 1 in ends])
+                trigrams.extend([(words[i], words[i + 1], words[i + 2]) for i in content if i + 2 in ends])
+            # One Counter.update per chunk and phrase length; per-response calls dominate otherwise
+            self.counters[1].update(unigrams)
+            self.counters[2].update(bigrams)
+            self.counters[3].update(trigrams)
+            for n in (2, 3):
+                if len(self.counters[n]) > self.max_phrases:
+                    self._prune(self.counters[n])
+
+    def _prune(self, counter):
+        # Lossy counting: drop phrases seen at most ``floor`` times until half the budget is free
+        floor = 1
+        while len(counter) > self.max_phrases // 2:
+            for phrase in [phrase for phrase, count in counter.items() if count <= floor]:
+                del counter[phrase]
+            floor += 1
+
+    def most_common(self, n, k):
+        """Top ``k`` words (n=1) or n-word phrases as (text, count) pairs"""
+        if n == 1:
+            return self.counters[1].most_common(k)
+        return [(" ".join(phrase), count) for phrase, count in self.counters[n].most_common(k)]
+
+
+# ========== TOKEN BUDGETING ========== #
+def estimate_tokens(text):
+    """Rough token count for Llama-style tokenizers (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def chunk_by_tokens(items, max_tokens, max_items=None, truncate=True):
+    """Greedily pack items, in order, into chunks of at most ``max_tokens`` (and ``max_items``).
+
+    An item larger than the budget is truncated, or given a chunk of its own when ``truncate`` is False.
+    """
+    chunks, current, current_tokens = [], [], 0
+    for item in items:
+        if truncate and estimate_tokens(item) > max_tokens:
+            item = item[:max_tokens * 4]
+        item_tokens = estimate_tokens(item)
+        if current and (current_tokens + item_tokens > max_tokens
+                        or (max_items and len(current) >= max_items)):
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += item_tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# ========== ANALYSIS BUNDLE ========== #
+ANALYSIS_BUNDLE_SCHEMA = """{
+  "key_themes": [{"title": "string", "description": "string", "sentiment": "Positive|Neutral|Negative"}],
+  "suggestions": [{"heading": "string", "recommendations": ["string"]}],
+  "narrative_summary": "string",
+  "key_takeaways": {
+    "key_wins": [{"theme": "string", "summary": "string"}],
+    "next_steps": [{"theme": "string", "action": "string"}]
+  }
+}"""
+
+_CODE_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$')
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+
+
+def parse_json_object(raw):
+    """Parse a JSON object from LLM output, repairing fences, smart quotes and trailing commas. Returns {} on failure."""
+    if not raw:
+        return {}
+    text = _CODE_FENCE_RE.sub('', raw.strip())
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        return {}
+    text = text[start:end + 1]
+    for candidate in (text, _TRAILING_COMMA_RE.sub(r'\1', text.replace('\u201c', '"').replace('\u201d', '"'))):
+        try:
+            parsed = json.loads(candidate)
+        except ValueError:
+            continue
+        return parsed if isinstance(parsed, dict) else {}
+    return {}
+
+
+def _clean(value):
+    return value.strip() if isinstance(value, str) else ""
+
+
+def render_analysis_bundle(bundle):
+    """Render validated bundle sections in the Markdown layout the per-section prompts produce"""
+    sections = {}
+
+    themes = [t for t in bundle.get("key_themes") or [] if isinstance(t, dict) and _clean(t.get("title"))]
+    if themes:
+        sections["key_themes"] = "\n\n".join(
+            f"**{_clean(t['title'])}**\n{_clean(t.get('description'))} (Sentiment: {_clean(t.get('sentiment')) or 'Neutral'})"
+            for t in themes
+        )
+
+    groups = []
+    for group in bundle.get("suggestions") or []:
+        if not isinstance(group, dict):
+            continue
+        recommendations = [_clean(r) for r in group.get("recommendations") or [] if _clean(r)]
+        if _clean(group.get("heading")) and recommendations:
+            groups.append(f"**{_clean(group['heading'])}**\n" + "\n".join(recommendations))
+    if groups:
+        sections["suggestions"] = "\n\n".join(groups)
+
+    summary = _clean(bundle.get("narrative_summary"))
+    if summary:
+        sections["narrative_summary"] = format_emphasis(summary)
+
+    takeaways = bundle.get("key_takeaways")
+    if isinstance(takeaways, dict):
+        blocks = []
+        for heading, key, text_key in (("Key Wins", "key_wins", "summary"), ("Next Steps", "next_steps", "action")):
+            items = [i for i in takeaways.get(key) or [] if isinstance(i, dict) and _clean(i.get("theme"))]
+            if items:
+                blocks.append(f"**{heading}**\n" + "\n".join(
+                    f"- **{_clean(i['theme'])}:** {_clean(i.get(text_key))}" for i in items
+                ))
+        if blocks:
+            sections["key_takeaways"] = "\n\n".join(blocks)
+
+    return sections
+
+
+# Compiled patterns for the local Markdown emphasis pass
+_MD_HEADING_RE = re.compile(r'^#{1,6}\s*(.+?)\s*#*$')
+_BULLET_RE = re.compile(r'^((?:[-•]|\*(?!\*)|\d+\.)\s+)?(.*)$')
+_BOLD_LABEL_RE = re.compile(r'^\*\*([^*]+?)\*\*\s*:(?=\s|$)\s*(.*)$')
+_LABEL_RE = re.compile(r'^([^:*()\[\]]{1,60}?)\s*:(?=\s|$)\s*(.*)$')
+_HAS_LETTER_RE = re.compile(r'[A-Za-z]')
+_SENTENCE_END_RE = re.compile(r'[.!?,;)]$')
+_URL_RE = re.compile(r'https?://|www\.')
+
+
+def _emphasize_line(line, can_be_title):
+    indent = line[:len(line) - len(line.lstrip())]
+    stripped = line.strip()
+    if stripped.count('**') % 2:
+        # Unbalanced bold markers confuse both st.markdown and the DOCX parser
+        stripped = stripped.replace('**', '')
+    if not stripped:
+        return ''
+
+    heading = _MD_HEADING_RE.match(stripped)
+    if heading:
+        return f"{indent}**{heading.group(1).replace('**', '').rstrip(':').strip()}**"
+
+    bullet, body = _BULLET_RE.match(stripped).groups()
+    bullet = bullet or ''
+
+    bold_label = _BOLD_LABEL_RE.match(body)
+    if bold_label:
+        # "**Label**: text" -> "**Label:** text"
+        return f"{indent}{bullet}**{bold_label.group(1).strip()}:** {bold_label.group(2)}".rstrip()
+    if body.startswith('**'):
+        return f"{indent}{bullet}{body}"
+
+    label = _LABEL_RE.match(body)
+    if label and _HAS_LETTER_RE.search(label.group(1)) and len(label.group(1).split()) <= 8:
+        return f"{indent}{bullet}**{label.group(1).strip()}:** {label.group(2)}".rstrip()
+
+    if can_be_title and _is_short_plain_line(line):
+        return f"{indent}**{body}**"
+    return f"{indent}{bullet}{body}"
+
+
+def _is_short_plain_line(line):
+    """A few words with no bullet, heading, label, bold, URL or sentence punctuation"""
+    stripped = line.strip()
+    if not stripped or stripped.startswith(('#', '**')):
+        return False
+    bullet, body = _BULLET_RE.match(stripped).groups()
+    return (not bullet and len(body.split()) <= 6 and not _LABEL_RE.match(body)
+            and not _SENTENCE_END_RE.search(body) and not _URL_RE.search(body))
+
+
+def format_emphasis(text):
+    """Bold headings, section titles and 'Label:' prefixes with the same rules boldify_with_llm gives the model"""
+    lines = text.strip().splitlines()
+    formatted = []
+    for idx, line in enumerate(lines):
+        # A section title opens a block (start of text or after a blank line) and heads its content.
+        # When the next line is another short plain line the block is a list of items, not a title.
+        starts_block = idx == 0 or not lines[idx - 1].strip()
+        next_line = lines[idx + 1] if idx + 1 < len(lines) else ""
+        can_be_title = starts_block and bool(next_line.strip()) and not _is_short_plain_line(next_line)
+        formatted.append(_emphasize_line(line, can_be_title))
+    return "\n".join(formatted)
+
+
+def boldify_with_llm(text, model, use_cache=True, tier=None):
     prompt = f'''
 You are a formatting assistant. For the text below, identify all headings, section titles, and important phrases (such as the names of key themes, wins, or next steps) and wrap them in Markdown bold (**...**). Do not change the wording or structure of the text. Only add bold formatting where appropriate.
 
@@ -404,8 +1093,11 @@ TEXT:
 
 Return only the formatted text.
 '''
-    response = model.chat.completions.create(
-        model="llama3-70b-8192",
-        messages=[{"role": "user", "content": prompt}]
+    response = llm_complete(
+        model,
+        messages=[{"role": "user", "content": prompt}],
+        stage="boldify",
+        tier=tier,
+        use_cache=use_cache
     )
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+    return response.strip()
\ No newline at end of file
@@ -1,15 +1,55 @@
 import streamlit as st
-from charts import create_sentiment_chart
-import pandas as pd
-import matplotlib.pyplot as plt
+from charts import create_sentiment_chart, get_pyplot
 from analyzer import FeedbackAnalyzer
 from report_generator import create_docx_report
+from batch_report import extract_feedback
+import model_registry
+from llm_cache import get_cache
+from sentiment_cache import get_sentiment_cache
+from llm_scheduler import latency_tracker, scheduler_stats
+from llm_gateway import spot_check_stats, usage_stats
+import hashlib
 import os
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# ========== ANALYSIS MEMOIZATION ========== #
+# Finished analyses kept per process (shared by every session); each holds one full result dict
+ANALYSIS_CACHE_ENTRIES = int(os.getenv("ANALYSIS_CACHE_ENTRIES", 8))
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", 3600))
+
+
+def feedback_fingerprint(feedback_list):
+    """SHA-256 of the feedback in order, so the memo key stays small however large the upload is"""
+    digest = hashlib.sha256()
+    for feedback in feedback_list:
+        digest.update(str(feedback).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@st.cache_data(max_entries=ANALYSIS_CACHE_ENTRIES, ttl=ANALYSIS_CACHE_TTL, show_spinner=False)
+def run_analysis(feedback_key, options, _feedback_list, _groq_api_key):
+    """Analysis keyed on the feedback fingerprint and analyzer options; the list itself is not hashed"""
+    return FeedbackAnalyzer(_groq_api_key, **dict(options)).analyze_feedback(_feedback_list)
+
+
+def get_analysis(feedback_list, groq_api_key, options):
+    """Memoized analysis, recomputed when the AI response cache is switched off"""
+    if not options.get("use_llm_cache", True):
+        return FeedbackAnalyzer(groq_api_key, **options).analyze_feedback(feedback_list)
+    return run_analysis(feedback_fingerprint(feedback_list), tuple(sorted(options.items())),
+                        feedback_list, groq_api_key)
+
+
+def show_diagnostics(messages):
+    """Render analyzer warnings and errors once they are back on the script thread"""
+    for level, message in dict.fromkeys(messages):
+        {"error": st.error, "warning": st.warning}.get(level, st.info)(message)
+
 def display_analysis_results(analysis):
     """Display analysis results in Streamlit"""
     if not analysis:
@@ -24,11 +64,30 @@ def display_analysis_results(analysis):
     if sentiment_data:
         with st.expander("😃 Sentiment Analysis"):
             st.write(f"**Total Responses:** {analysis.get('total_responses', 0)}")
+            filter_stats = analysis.get("filter_stats") or {}
+            if filter_stats.get("llm_calls_saved"):
+                st.caption(
+                    f"Relevance filter: {filter_stats['rules_relevant'] + filter_stats['rules_irrelevant']} decided by rules, "
+                    f"{filter_stats['duplicates']} duplicates, {filter_stats['llm_decided']} by AI "
+                    f"({filter_stats['llm_calls_saved']} AI calls saved)"
+                )
+            if filter_stats.get("llm_failed_batches"):
+                st.warning(f"{filter_stats['llm_failed_batches']} relevance batch(es) failed and were kept unfiltered")
+            dedup = analysis.get("dedup") or {}
+            if dedup.get("unique", 0) < dedup.get("responses", 0):
+                st.caption(
+                    f"Duplicates: {dedup['responses']} relevant responses collapsed to {dedup['unique']} distinct answers "
+                    f"({dedup['dedup_ratio']:.0%} fewer; {dedup['exact_duplicates']} exact, {dedup['near_duplicates']} near), "
+                    f"saving {dedup['sentiment_items_saved']} sentiment scorings and ~{dedup['prompt_tokens_saved']} prompt tokens"
+                )
             col1, col2, col3 = st.columns(3)
             col1.metric("Positive", f"{sentiment_data.get('positive', 0)} ({sentiment_data.get('percentages', {}).get('positive', 0):.1f}%)")
             col2.metric("Neutral", f"{sentiment_data.get('neutral', 0)} ({sentiment_data.get('percentages', {}).get('neutral', 0):.1f}%)")
             col3.metric("Negative", f"{sentiment_data.get('negative', 0)} ({sentiment_data.get('percentages', {}).get('negative', 0):.1f}%)")
             st.write(f"**Overall Sentiment Score:** {sentiment_data.get('overall_score', 0):.2f}")
+            if sentiment_data.get("cascade"):
+                st.caption(f"RoBERTa scored {sentiment_data['cascade']['escalated']} borderline responses "
+                           f"({sentiment_data['cascade']['escalation_rate']:.0%}); the rest were settled by VADER + TextBlob")
             
             sentiment_chart = create_sentiment_chart({
                 "Positive": sentiment_data.get('positive', 0),
@@ -48,12 +107,18 @@ def display_analysis_results(analysis):
             if text_analysis.get('most_common_words'):
                 st.subheader("Top 20 Most Common Words")
                 words, frequencies = zip(*text_analysis['most_common_words'])
+                plt = get_pyplot()
                 plt.figure(figsize=(10, 6))
                 plt.barh(words, frequencies, color='#2196F3')
                 plt.xlabel('Frequency')
                 plt.title('Top 20 Most Common Words')
                 plt.gca().invert_yaxis()
                 st.pyplot(plt)
+
+            phrases = text_analysis.get('most_common_trigrams', []) + text_analysis.get('most_common_bigrams', [])
+            if phrases:
+                st.subheader("Common Phrases")
+                st.write(", ".join(f"{phrase} ({count})" for phrase, count in phrases))
             
             if text_analysis.get('key_themes'):
                 st.subheader("Key Themes")
@@ -65,11 +130,19 @@ def display_analysis_results(analysis):
     with st.expander("✨ Suggestions"):
         st.markdown(analysis.get("suggestions", ""))
 
-    # Detailed sentiment analysis
-    if sentiment_data and sentiment_data.get('detailed_analysis'):
+    # Detailed sentiment analysis, one page of records built at a time
+    results = sentiment_data.get("results") if sentiment_data else None
+    if results is not None and len(results):
         with st.expander("🔍 Detailed Sentiment Analysis"):
-            for i, item in enumerate(sentiment_data['detailed_analysis'][:20]):  # Show first 20
-                st.write(f"**Feedback {i+1}:**")
+            page_size = 20
+            filter_col, page_col = st.columns(2)
+            shown = filter_col.selectbox("Show", ["All", "Positive", "Neutral", "Negative"], key="detail_filter")
+            sentiment = None if shown == "All" else shown.lower()
+            total = len(results) if sentiment is None else len(results.indices(sentiment))
+            pages = max(1, -(-total // page_size))
+            page = page_col.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key="detail_page")
+            for idx, item in results.page((page - 1) * page_size, page_size, sentiment):
+                st.write(f"**Feedback {idx+1}:**")
                 st.caption(f"Sentiment: {item.get('sentiment', '')} (Confidence: {item.get('confidence', 0):.2f})")
                 st.write(item.get('feedback', ''))
                 st.divider()
@@ -102,6 +175,62 @@ def main():
     with st.sidebar:
         st.header("⚙️ Configuration")
         use_roberta = st.checkbox("Use RoBERTa for sentiment analysis (more accurate)")
+        roberta_runtime = st.radio("RoBERTa runtime", ["PyTorch", "ONNX int8 (faster on CPU)"], disabled=not use_roberta,
+                                   help="The ONNX model must be exported once with 'python onnx_sentiment.py export'")
+        roberta_backend = "onnx" if roberta_runtime.startswith("ONNX") else "pytorch"
+        roberta_cascade = st.checkbox("Only send borderline responses to RoBERTa (faster)", disabled=not use_roberta,
+                                      help="VADER + TextBlob settle clear-cut responses; RoBERTa scores the rest")
+
+        # Models are shared by every session in this process; load them once up front
+        warm_col, evict_col = st.columns(2)
+        if warm_col.button("🔥 Warm Up Models", use_container_width=True):
+            with st.spinner("Loading models..."):
+                timings = model_registry.warm_up(use_roberta=use_roberta, roberta_backend=roberta_backend)
+            st.caption(", ".join(f"{name}: {secs:.2f}s" for name, secs in timings.items()))
+        if evict_col.button("🧹 Unload Models", use_container_width=True):
+            st.caption(f"Unloaded {model_registry.evict()} cached model(s)")
+
+        collapse_duplicates = st.checkbox("Collapse duplicate responses", value=True,
+                                          help="Repeated and near-identical answers are scored and sent to the AI once, weighted by count")
+        use_llm_cache = st.checkbox("Reuse cached AI responses", value=True,
+                                    help="Identical prompts are answered from the local cache instead of Groq")
+        use_analysis_bundle = st.checkbox("Combine AI sections into one request (fewer tokens)", value=False)
+        model_routing = st.radio("AI model routing", ["Per stage (faster)", "Large model only"],
+                                 help="Per stage sends classification and formatting to a small fast model")
+        model_tier = "large" if model_routing == "Large model only" else None
+        analyzer_options = {
+            "use_roberta": use_roberta,
+            "roberta_backend": roberta_backend,
+            "roberta_cascade": roberta_cascade,
+            "collapse_duplicates": collapse_duplicates,
+            "use_llm_cache": use_llm_cache,
+            "use_analysis_bundle": use_analysis_bundle,
+            "model_tier": model_tier,
+        }
+        if st.button("♻️ Clear Saved Analyses", use_container_width=True,
+                     help="Forget memoized results so the next click re-runs the analysis"):
+            run_analysis.clear()
+            st.session_state.pop("analysis", None)
+        cache_stats = get_cache().stats()
+        st.caption(f"AI response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} stored")
+        sentiment_cache_stats = get_sentiment_cache().stats()
+        st.caption(f"Sentiment cache: {sentiment_cache_stats['hits']} hits, {sentiment_cache_stats['misses']} misses, "
+                   f"{sentiment_cache_stats['entries']} stored")
+        queue_stats = scheduler_stats()
+        st.caption(
+            f"Groq queue: {queue_stats['queue_depth']} waiting, {queue_stats['retries']} retries "
+            f"({queue_stats['throttled']} rate-limited), avg wait {queue_stats['avg_wait_seconds']:.1f}s"
+        )
+        usage = usage_stats().values()
+        st.caption(
+            f"AI usage: {sum(u['calls'] for u in usage)} calls, "
+            f"{sum(u['prompt_tokens'] + u['completion_tokens'] for u in usage):,} tokens"
+        )
+        spot_checks = spot_check_stats()
+        if spot_checks:
+            st.caption("Fast model spot checks: " + ", ".join(
+                f"{stage} {entry['mean_score']:.0%}" for stage, entry in spot_checks.items() if entry["scored"]
+            ))
         st.divider()
         
         st.header("📤 Data Import")
@@ -113,29 +242,9 @@ def main():
             uploaded_file = st.file_uploader("Upload feedback CSV", type="csv")
             if uploaded_file:
                 try:
+                    import pandas as pd  # deferred: only needed once a CSV is uploaded
                     df = pd.read_csv(uploaded_file)
-                    
-                    # Find feedback columns
-                    feedback_cols = []
-                    for col in df.columns:
-                        col_lower = col.lower()
-                        if ('feedback' in col_lower or 
-                            'comment' in col_lower or 
-                            'suggestion' in col_lower or 
-                            'review' in col_lower or 
-                            'response' in col_lower):
-                            feedback_cols.append(col)
-                    
-                    # Process feedback
-                    if feedback_cols:
-                        for col in feedback_cols:
-                            feedback_list.extend(df[col].dropna().astype(str).tolist())
-                    else:
-                        # Fallback to all text columns
-                        for col in df.columns:
-                            if df[col].dtype == 'object':
-                                feedback_list.extend(df[col].dropna().astype(str).tolist())
-                    
+                    feedback_list = extract_feedback(df)
                     st.success(f"Loaded {len(feedback_list)} feedback entries")
                 except Exception as e:
                     st.error(f"Error reading file: {str(e)}")
@@ -283,11 +392,13 @@ def main():
     with col1:
         if st.button("🔍 Analyze Feedback Only", use_container_width=True):
             with st.spinner("Analyzing feedback..."):
-                analyzer = FeedbackAnalyzer(groq_api_key, use_roberta=use_roberta)
-                analysis = analyzer.analyze_feedback(feedback_list)
+                start = time.perf_counter()
+                analysis = get_analysis(feedback_list, groq_api_key, analyzer_options)
                 st.session_state.analysis = analysis
-                st.session_state.analyzer = analyzer
-                st.success("✅ Analysis completed!")
+                show_diagnostics(analysis.get("diagnostics", []))
+                elapsed = time.perf_counter() - start
+                latency_tracker.record("analysis", elapsed)
+                st.success(f"✅ Analysis completed in {elapsed:.1f}s")
     
     with col2:
         if st.button("✨ Generate Full Report", use_container_width=True):
@@ -296,10 +407,11 @@ def main():
                 st.stop()
                 
             with st.spinner("Analyzing feedback and generating report..."):
-                analyzer = FeedbackAnalyzer(groq_api_key, use_roberta=use_roberta)
-                analysis = analyzer.analyze_feedback(feedback_list)
+                start = time.perf_counter()
+                # After "Analyze Feedback Only" on the same input this is a memo hit, leaving only the DOCX build
+                analysis = get_analysis(feedback_list, groq_api_key, analyzer_options)
                 st.session_state.analysis = analysis
-                st.session_state.analyzer = analyzer
+                analyzer = FeedbackAnalyzer(groq_api_key, **analyzer_options)
                 
                 # Generate DOCX report
                 docx_bytes = create_docx_report(
@@ -307,8 +419,12 @@ def main():
                     analysis,
                     analyzer
                 )
+                show_diagnostics(analysis.get("diagnostics", []) + list(analyzer.messages))
                 
-                st.success("✅ Report generated successfully!")
+                elapsed = time.perf_counter() - start
+                latency_tracker.record("report", elapsed)
+                st.success(f"✅ Report generated successfully in {elapsed:.1f}s "
+                           f"(p99 so far: {latency_tracker.percentile('report', 99):.1f}s)")
                 st.download_button(
                     label="📥 Download DOCX Report",
                     data=docx_bytes,
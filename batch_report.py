@@ -0,0 +1,200 @@
+"""
+Headless batch report generation for many events at once.
+
+Usage:
+    python batch_report.py events/ --out reports/ --workers 4
+    python batch_report.py manifest.json --out reports/
+
+Directory input: every <name>.csv holds one event's feedback, and an optional
+<name>.json next to it holds the event details (the same keys the app's Event
+Details form saves, e.g. event_name, event_date, topics, special_mentions).
+
+Manifest input: a JSON list of {"name": ..., "feedback": "a.csv", "details": "a.json"}
+with paths relative to the manifest.
+
+Events run across a process pool that shares one Groq rate budget. Finished events
+are recorded in <out>/batch_progress.jsonl and skipped when the command is re-run,
+so a failed batch resumes where it stopped (use --force to redo everything).
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+import llm_gateway
+import llm_scheduler
+
+PROGRESS_FILE = "batch_progress.jsonl"
+FEEDBACK_COLUMN_HINTS = ("feedback", "comment", "suggestion", "review", "response")
+
+
+# ========== INPUTS ========== #
+def extract_feedback(df):
+    """Feedback strings from a survey export: columns named like feedback, else every text column"""
+    feedback_cols = [col for col in df.columns if any(hint in col.lower() for hint in FEEDBACK_COLUMN_HINTS)]
+    if not feedback_cols:
+        feedback_cols = [col for col in df.columns if df[col].dtype == 'object']
+    feedback_list = []
+    for col in feedback_cols:
+        feedback_list.extend(df[col].dropna().astype(str).tolist())
+    return feedback_list
+
+
+def load_jobs(source):
+    """List of {"name", "feedback", "details"} jobs from a directory of CSVs or a JSON manifest"""
+    if os.path.isdir(source):
+        jobs = []
+        for filename in sorted(os.listdir(source)):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() != ".csv":
+                continue
+            details = os.path.join(source, stem + ".json")
+            jobs.append({
+                "name": stem,
+                "feedback": os.path.join(source, filename),
+                "details": details if os.path.exists(details) else None,
+            })
+        return jobs
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        entries = json.load(f)
+    jobs = []
+    for entry in entries:
+        feedback = os.path.join(base, entry["feedback"])
+        details = entry.get("details")
+        jobs.append({
+            "name": entry.get("name") or os.path.splitext(os.path.basename(feedback))[0],
+            "feedback": feedback,
+            "details": os.path.join(base, details) if details else None,
+        })
+    return jobs
+
+
+def load_completed(out_dir):
+    """Names of events already written by a previous run"""
+    path = os.path.join(out_dir, PROGRESS_FILE)
+    if not os.path.exists(path):
+        return set()
+    completed = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a run killed mid-write leaves a partial last line
+            if record.get("status") == "ok" and os.path.exists(record.get("output", "")):
+                completed.add(record["name"])
+    return completed
+
+
+# ========== WORKERS ========== #
+def _init_worker(budget):
+    llm_scheduler.install_shared_budget(budget)
+
+
+def process_event(job, out_dir, groq_api_key, options):
+    """Analyze one event and write its DOCX report. Returns a timing record; never raises."""
+    import pandas as pd
+    from analyzer import FeedbackAnalyzer
+    from report_generator import create_docx_report
+
+    record = {"name": job["name"], "status": "ok"}
+    start = time.perf_counter()
+    try:
+        feedback_list = extract_feedback(pd.read_csv(job["feedback"]))
+        report_data = {"event_name": job["name"]}
+        if job["details"]:
+            with open(job["details"], encoding="utf-8") as f:
+                report_data.update(json.load(f))
+
+        analyzer = FeedbackAnalyzer(groq_api_key, **options)
+        analysis = analyzer.analyze_feedback(feedback_list)
+        record["analysis_seconds"] = time.perf_counter() - start
+
+        report_start = time.perf_counter()
+        docx_bytes = create_docx_report(report_data, analysis, analyzer)
+        output = os.path.join(out_dir, f"{job['name'].replace(' ', '_')}_report.docx")
+        with open(output, "wb") as f:
+            f.write(docx_bytes.getvalue())
+        record["report_seconds"] = time.perf_counter() - report_start
+        record["responses"] = len(feedback_list)
+        record["output"] = output
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+# ========== CLI ========== #
+def main():
+    parser = argparse.ArgumentParser(description="Generate DOCX event reports for many feedback CSVs")
+    parser.add_argument("source", help="directory of feedback CSVs or a JSON manifest")
+    parser.add_argument("--out", default="reports", help="output directory for reports and progress")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--force", action="store_true", help="redo events completed by an earlier run")
+    parser.add_argument("--roberta", action="store_true", help="use RoBERTa for sentiment analysis")
+    parser.add_argument("--onnx", action="store_true", help="run RoBERTa on the int8 ONNX Runtime export")
+    parser.add_argument("--cascade", action="store_true", help="only send borderline responses to RoBERTa")
+    parser.add_argument("--keep-duplicates", action="store_true", help="score and prompt every response separately")
+    parser.add_argument("--bundle", action="store_true", help="combine AI sections into one request")
+    parser.add_argument("--large-only", action="store_true", help="run every AI stage on the large model")
+    parser.add_argument("--no-llm-cache", action="store_true", help="do not reuse cached AI responses")
+    parser.add_argument("--no-sentiment-cache", action="store_true", help="rescore every response from scratch")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    groq_api_key = os.getenv("GROQ_API_KEY")
+
+    os.makedirs(args.out, exist_ok=True)
+    jobs = load_jobs(args.source)
+    completed = set() if args.force else load_completed(args.out)
+    pending = [job for job in jobs if job["name"] not in completed]
+    if completed:
+        print(f"Skipping {len(jobs) - len(pending)} event(s) completed by a previous run")
+    if not pending:
+        return 0
+
+    options = {
+        "use_roberta": args.roberta,
+        "roberta_backend": "onnx" if args.onnx else "pytorch",
+        "roberta_cascade": args.cascade,
+        "collapse_duplicates": not args.keep_duplicates,
+        "use_llm_cache": not args.no_llm_cache,
+        "use_sentiment_cache": not args.no_sentiment_cache,
+        "use_analysis_bundle": args.bundle,
+        "model_tier": "large" if args.large_only else None,
+    }
+    # Every worker draws from the same per-model RPM/TPM budgets instead of each getting the full limits
+    budget = llm_scheduler.make_shared_budget(llm_gateway.MODEL_TIERS)
+
+    failures = 0
+    start = time.perf_counter()
+    print(f"{'event':<32} {'status':>7} {'responses':>9} {'analysis_s':>10} {'report_s':>8} {'total_s':>8}")
+    with open(os.path.join(args.out, PROGRESS_FILE), "a", encoding="utf-8") as progress, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_worker,
+                                                   initargs=(budget,)) as pool:
+        futures = [pool.submit(process_event, job, args.out, groq_api_key, options) for job in pending]
+        for future in concurrent.futures.as_completed(futures):
+            record = future.result()
+            progress.write(json.dumps(record) + "\n")
+            progress.flush()
+            if record["status"] != "ok":
+                failures += 1
+                print(f"{record['name'][:32]:<32} {'failed':>7}  {record['error']}")
+                continue
+            print(f"{record['name'][:32]:<32} {'ok':>7} {record['responses']:>9} {record['analysis_seconds']:>10.1f} "
+                  f"{record['report_seconds']:>8.1f} {record['seconds']:>8.1f}")
+
+    print(f"{len(pending) - failures}/{len(pending)} event(s) done in {time.perf_counter() - start:.1f}s")
+    if failures:
+        print("Re-run the same command to retry the failed events.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
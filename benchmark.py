@@ -0,0 +1,425 @@
+"""
+Local performance benchmarks for the feedback analysis pipeline.
+
+Usage:
+    python benchmark.py roberta-batch --items 2000 --batch-sizes 1 8 32 64
+    python benchmark.py cold-warm --roberta
+    python benchmark.py sampling --items 50000
+    python benchmark.py hedging --calls 300
+    python benchmark.py import-time
+    python benchmark.py onnx-compare --items 1000 --threads 1 2 4
+    python benchmark.py cascade --items 2000
+    python benchmark.py lexicon-parallel --items 100000 --workers 1 2 4 8
+    python benchmark.py sentiment-memory --items 100000
+    python benchmark.py dedup --items 20000 --unique-share 0.2
+    python benchmark.py sentiment-cache --items 20000 --events 3
+    python benchmark.py text-analysis --items 200000
+"""
+import argparse
+import random
+import subprocess
+import sys
+import time
+
+# ========== SYNTHETIC FEEDBACK ========== #
+_OPENERS = [
+    "Great session", "The workshop was very informative", "Loved the hands-on part",
+    "Speaker explained the concepts clearly", "Too long and a bit boring",
+    "Sound setup was bad in the back rows", "Could be better organised",
+    "Really enjoyed the problem solving round", "Not enough time for questions",
+    "The venue was too crowded", "Amazing energy from the organising team",
+]
+_DETAILS = [
+    "", "!!", " overall.", " but the slides were hard to read.",
+    " and I would like more sessions like this.", ", please share the recording.",
+    " though the wifi kept dropping during the live demo.",
+    " - more advanced topics next time would be great.",
+]
+
+
+def sample_feedback(n, seed=0):
+    """Deterministic synthetic feedback corpus of ``n`` items with mixed lengths."""
+    rng = random.Random(seed)
+    return [rng.choice(_OPENERS) + rng.choice(_DETAILS) for _ in range(n)]
+
+
+def sample_unique_feedback(n, seed=0):
+    """Like sample_feedback, but every item is a distinct string so no cache or dedup can skip work."""
+    return [f"{text} #{i}" for i, text in enumerate(sample_feedback(n, seed))]
+
+
+# ========== BENCHMARKS ========== #
+def bench_roberta_batch(args):
+    from analyzer import FeedbackAnalyzer
+
+    feedback = sample_unique_feedback(args.items)
+    analyzer = FeedbackAnalyzer(use_roberta=True, use_sentiment_cache=False)
+    if not analyzer.roberta_analyzer:
+        raise SystemExit("RoBERTa pipeline could not be loaded")
+
+    analyzer._perform_sentiment_analysis(feedback[:16])  # warm-up
+    print(f"{'batch_size':>10} {'seconds':>10} {'items/sec':>10}")
+    for batch_size in args.batch_sizes:
+        analyzer.roberta_batch_size = batch_size
+        start = time.perf_counter()
+        analyzer._perform_sentiment_analysis(feedback)
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>10} {elapsed:>10.2f} {len(feedback) / elapsed:>10.1f}")
+
+
+def bench_cold_warm(args):
+    import model_registry
+    from analyzer import FeedbackAnalyzer
+
+    feedback = sample_unique_feedback(args.items)
+    model_registry.evict()
+    print(f"{'click':>6} {'init_s':>8} {'analysis_s':>10}")
+    for label in ("cold", "warm"):
+        start = time.perf_counter()
+        analyzer = FeedbackAnalyzer(use_roberta=args.roberta, use_sentiment_cache=False)
+        init_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        analyzer._perform_sentiment_analysis(feedback)
+        print(f"{label:>6} {init_elapsed:>8.2f} {time.perf_counter() - start:>10.2f}")
+
+
+def bench_sampling(args):
+    from sampling import select_representatives
+
+    feedback = sample_feedback(args.items)
+    start = time.perf_counter()
+    sample = select_representatives(feedback, token_budget=args.token_budget)
+    elapsed = time.perf_counter() - start
+    print(f"{len(feedback)} items -> {len(sample)} representatives in {elapsed:.3f}s")
+
+
+def bench_hedging(args):
+    """Simulated LLM calls with a slow tail, with and without hedged duplicates."""
+    import llm_scheduler
+
+    llm_scheduler._schedulers[None] = llm_scheduler.LLMScheduler(requests_per_minute=1e6, tokens_per_minute=1e9)
+    rng = random.Random(args.seed)
+
+    def fake_call(timeout):
+        # Most calls are quick; a few percent stall the way slow Groq completions do
+        delay = rng.uniform(0.4, 3.0) if rng.random() < args.tail_rate else rng.uniform(0.02, 0.06)
+        time.sleep(min(delay, timeout))
+        return "ok"
+
+    print(f"{'mode':>8} {'p50_s':>7} {'p95_s':>7} {'p99_s':>7} {'hedged':>7}")
+    for hedge in (False, True):
+        stage = f"bench-{'hedged' if hedge else 'plain'}"
+        before = llm_scheduler.hedge_stats()["hedged"]
+        latencies = []
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            llm_scheduler.call_with_deadline(fake_call, stage=stage, hedge=hedge)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        pct = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+        hedged = llm_scheduler.hedge_stats()["hedged"] - before
+        print(f"{'hedged' if hedge else 'plain':>8} {pct(50):>7.3f} {pct(95):>7.3f} {pct(99):>7.3f} {hedged:>7}")
+
+
+def bench_import_time(args):
+    """Fresh-interpreter import time of each module, on top of an already imported streamlit."""
+    # Streamlit is loaded once by the server, so it is not part of an app's cold start
+    code = ("import time, streamlit, logging; logging.disable(logging.CRITICAL); "
+            "start = time.perf_counter(); import {}; print(time.perf_counter() - start)")
+    print(f"{'module':>24} {'best_s':>8}")
+    for module in args.modules:
+        runs = []
+        for _ in range(args.repeat):
+            result = subprocess.run([sys.executable, "-c", code.format(module)],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                raise SystemExit(f"importing {module} failed:\n{result.stderr}")
+            runs.append(float(result.stdout.strip().splitlines()[-1]))
+        print(f"{module:>24} {min(runs):>8.3f}")
+
+
+def bench_onnx_compare(args):
+    """Throughput and agreement of the int8 ONNX model against the PyTorch pipeline on the same corpus."""
+    import model_registry
+
+    feedback = sample_feedback(args.items)
+
+    def run(pipe):
+        pipe(feedback[:16], batch_size=16, truncation=True)  # warm-up
+        start = time.perf_counter()
+        outputs = pipe(feedback, batch_size=args.batch_size, truncation=True)
+        elapsed = time.perf_counter() - start
+        return elapsed, [max(output, key=lambda x: x["score"]) for output in outputs]
+
+    reference_s, reference = run(model_registry.get_sentiment_pipeline(model_registry.ROBERTA_MODEL, top_k=None))
+    print(f"{'backend':>14} {'items/sec':>10} {'speedup':>8} {'label_agree':>12} {'score_mae':>10}")
+    print(f"{'pytorch':>14} {len(feedback) / reference_s:>10.1f} {1.0:>8.2f} {1.0:>12.1%} {0.0:>10.4f}")
+    for threads in args.threads:
+        model_registry.evict("onnx-sentiment")
+        elapsed, top = run(model_registry.get_onnx_sentiment(threads=threads))
+        agree = sum(a["label"] == b["label"] for a, b in zip(top, reference)) / len(reference)
+        # Score gap on the items where both agree on the label
+        gaps = [abs(a["score"] - b["score"]) for a, b in zip(top, reference) if a["label"] == b["label"]]
+        mae = sum(gaps) / len(gaps) if gaps else float("nan")
+        print(f"{f'onnx-int8 x{threads}':>14} {len(feedback) / elapsed:>10.1f} {reference_s / elapsed:>8.2f} "
+              f"{agree:>12.1%} {mae:>10.4f}")
+
+
+def bench_cascade(args):
+    """Full RoBERTa vs the lexicon-first cascade: time, share escalated and agreement of the labels."""
+    from analyzer import FeedbackAnalyzer
+
+    feedback = sample_unique_feedback(args.items)
+    backend = "onnx" if args.onnx else "pytorch"
+    runs = {}
+    print(f"{'mode':>8} {'seconds':>8} {'escalated':>10} {'speedup':>8} {'agree':>7}")
+    for mode in ("full", "cascade"):
+        analyzer = FeedbackAnalyzer(use_roberta=True, roberta_backend=backend, roberta_cascade=mode == "cascade",
+                                    use_sentiment_cache=False)
+        if not analyzer.roberta_analyzer:
+            raise SystemExit("RoBERTa could not be loaded")
+        analyzer._perform_sentiment_analysis(feedback[:16])  # warm-up
+        start = time.perf_counter()
+        result = analyzer._perform_sentiment_analysis(feedback)
+        runs[mode] = (time.perf_counter() - start, [s["sentiment"] for s in result["scores"]])
+        rate = result.get("cascade", {}).get("escalation_rate", 1.0)
+        agree = sum(a == b for a, b in zip(runs[mode][1], runs["full"][1])) / len(feedback)
+        print(f"{mode:>8} {runs[mode][0]:>8.2f} {rate:>10.1%} {runs['full'][0] / runs[mode][0]:>8.2f} {agree:>7.1%}")
+
+
+def bench_lexicon_parallel(args):
+    """VADER + TextBlob scoring time per worker count; every run must match the single-process result."""
+    from analyzer import FeedbackAnalyzer
+
+    feedback = sample_unique_feedback(args.items)
+    baseline = None
+    print(f"{'workers':>8} {'seconds':>8} {'items/sec':>10} {'speedup':>8} {'identical':>10}")
+    for workers in args.workers:
+        analyzer = FeedbackAnalyzer(lexicon_workers=workers, lexicon_parallel_min=1, use_sentiment_cache=False)
+        analyzer._perform_sentiment_analysis(feedback[:workers * 8])  # start and warm the pool
+        start = time.perf_counter()
+        result = analyzer._perform_sentiment_analysis(feedback)
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline = (elapsed, result)
+        print(f"{workers:>8} {elapsed:>8.2f} {len(feedback) / elapsed:>10.0f} {baseline[0] / elapsed:>8.2f} "
+              f"{str(result == baseline[1]):>10}")
+
+
+def bench_sentiment_memory(args):
+    """Memory held by per-item sentiment results: lists of dicts vs the columnar store (texts excluded)."""
+    import gc
+    import tracemalloc
+    from analyzer import FeedbackAnalyzer
+
+    # Unique strings, as in a real survey; they exist before either representation and are not counted
+    feedback = sample_unique_feedback(args.items)
+    analyzer = FeedbackAnalyzer(lexicon_parallel_min=10 ** 9, use_sentiment_cache=False)
+    results = analyzer._perform_sentiment_analysis(feedback)["results"]
+
+    def measure(build):
+        gc.collect()
+        tracemalloc.start()
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        return size
+
+    # What _perform_sentiment_analysis used to keep: two lists with one dict per item each
+    def columnar_copy():
+        store = results.__class__(results.texts)  # shares the text list, allocates fresh columns
+        for name, column in vars(results).items():
+            if name != "texts":
+                getattr(store, name)[:] = column
+        return store
+
+    before = measure(lambda: (list(results.scores), list(results.detailed_analysis)))
+    after = measure(columnar_copy)
+    print(f"{'layout':>10} {'MiB':>8} {'bytes/item':>11}")
+    print(f"{'dicts':>10} {before / 2 ** 20:>8.1f} {before / len(feedback):>11.0f}")
+    print(f"{'columnar':>10} {after / 2 ** 20:>8.1f} {after / len(feedback):>11.0f}")
+
+
+def bench_dedup(args):
+    """Duplicate collapsing on a survey with typed-in variants: dedup ratio, time and prompt tokens saved."""
+    from analyzer import FeedbackAnalyzer, estimate_tokens, normalize_feedback
+    from dedup import group_duplicates
+
+    rng = random.Random(args.seed)
+    feedback = []
+    for i, text in enumerate(sample_feedback(args.items, args.seed)):
+        roll = rng.random()
+        if roll < args.unique_share:
+            text = f"{text} Session {i} was my first event"  # a genuinely different answer
+        elif roll < 0.5:
+            text = rng.choice([text.lower(), text.upper(), text + "!!", "  " + text])
+        elif roll < 0.6:
+            pos = rng.randrange(1, len(text))
+            text = text[:pos] + text[pos - 1] + text[pos:]  # doubled letter typo
+        feedback.append(text)
+
+    analyzer = FeedbackAnalyzer(lexicon_parallel_min=10 ** 9, use_sentiment_cache=False)
+    start = time.perf_counter()
+    full = analyzer._perform_sentiment_analysis(feedback)
+    full_s = time.perf_counter() - start
+    start = time.perf_counter()
+    groups = group_duplicates(feedback, normalize_feedback)
+    collapsed = analyzer._perform_sentiment_analysis(feedback, groups)
+    collapsed_s = time.perf_counter() - start
+
+    stats = groups.stats()
+    tokens_before = estimate_tokens("\n".join(feedback))
+    tokens_after = estimate_tokens("\n".join(groups.with_counts(feedback)))
+    agree = sum(a == b for a, b in zip(full["results"].sentiment, collapsed["results"].sentiment)) / len(feedback)
+    print(f"responses {stats['responses']}, unique {stats['unique']} "
+          f"({stats['exact_duplicates']} exact + {stats['near_duplicates']} near duplicates), "
+          f"dedup ratio {stats['dedup_ratio']:.1%}, grouping {stats['seconds']:.2f}s"
+          + ("" if stats["near_checked"] else " (near-duplicate step stopped at its check budget)"))
+    print(f"{'sentiment':>10} {'seconds':>8} {'speedup':>8} {'agree':>7}")
+    print(f"{'per item':>10} {full_s:>8.2f} {1:>8.2f} {1:>7.1%}")
+    print(f"{'collapsed':>10} {collapsed_s:>8.2f} {full_s / collapsed_s:>8.2f} {agree:>7.1%}")
+    print(f"prompt feedback tokens {tokens_before} -> {tokens_after} ({1 - tokens_after / tokens_before:.1%} saved)")
+
+
+def bench_sentiment_cache(args):
+    """Sentiment scoring for a series of events that reuse phrases: first run vs with the persistent cache."""
+    import os
+    import tempfile
+    from analyzer import FeedbackAnalyzer
+    from sentiment_cache import SentimentCache
+    import sentiment_cache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A private cache file so the benchmark neither reads nor pollutes the real one
+        sentiment_cache._cache = SentimentCache(path=os.path.join(tmp, "sentiment_cache.sqlite3"))
+        cache = sentiment_cache._cache
+        uncached = FeedbackAnalyzer(use_sentiment_cache=False, collapse_duplicates=False, lexicon_parallel_min=10 ** 9)
+        cached = FeedbackAnalyzer(collapse_duplicates=False, lexicon_parallel_min=10 ** 9)
+        print(f"{'event':>6} {'uncached_s':>11} {'cached_s':>9} {'speedup':>8} {'hit rate':>9} {'identical':>10}")
+        for event in range(args.events):
+            # Each event shares the common phrases and adds answers of its own
+            feedback = [text if i % 5 else f"{text} (event {event}, response {i})"
+                        for i, text in enumerate(sample_feedback(args.items, seed=event))]
+            start = time.perf_counter()
+            baseline = uncached._perform_sentiment_analysis(feedback)
+            uncached_s = time.perf_counter() - start
+            hits_before, misses_before = cache.hits, cache.misses
+            start = time.perf_counter()
+            result = cached._perform_sentiment_analysis(feedback)
+            cached_s = time.perf_counter() - start
+            hits = cache.hits - hits_before
+            rate = hits / max(1, hits + cache.misses - misses_before)
+            print(f"{event + 1:>6} {uncached_s:>11.2f} {cached_s:>9.2f} {uncached_s / cached_s:>8.2f} {rate:>9.1%} "
+                  f"{str(result['scores'] == baseline['scores']):>10}")
+        sentiment_cache._cache = None
+
+
+def bench_text_analysis(args):
+    """Word statistics: the old joined-text pass vs the streaming pass (which also counts 2- and 3-word phrases)."""
+    import gc
+    import re
+    import tracemalloc
+    from collections import Counter
+    from analyzer import STOP_WORDS, FeedbackAnalyzer
+
+    # Unique suffixes keep the vocabulary and phrase counters growing like a real large survey
+    feedback = [text if i % 4 else f"{text} Ticket {i}." for i, text in enumerate(sample_feedback(args.items))]
+
+    def joined(feedback_list):
+        # What _perform_text_analysis used to do: one lowercased copy of everything, then lists over it
+        words = re.sub(r'[^\w\s]', '', " ".join(feedback_list).lower()).split()
+        word_freq = Counter(word for word in words if word not in STOP_WORDS and len(word) > 2)
+        return {"total_words": len(words), "unique_words": len(set(words)), "most_common_words": word_freq.most_common(20)}
+
+    analyzer = FeedbackAnalyzer()
+    runs = {"joined": joined, "streaming": lambda items: analyzer._perform_text_analysis(items, key_themes="")}
+    results = {}
+    print(f"{'pass':>10} {'seconds':>8} {'peak MiB':>9} {'identical':>10}")
+    for name, run in runs.items():
+        start = time.perf_counter()
+        results[name] = run(feedback)
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        tracemalloc.start()
+        run(feedback)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        identical = all(results[name][key] == value for key, value in results["joined"].items())
+        print(f"{name:>10} {elapsed:>8.2f} {peak / 2 ** 20:>9.1f} {str(identical):>10}")
+    print("top phrases:", ", ".join(f"{phrase} ({count})" for phrase, count in results["streaming"]["most_common_bigrams"][:5]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("roberta-batch", help="RoBERTa sentiment throughput per batch size")
+    p.add_argument("--items", type=int, default=2000)
+    p.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64])
+    p.set_defaults(func=bench_roberta_batch)
+
+    p = sub.add_parser("cold-warm", help="Analyzer construction latency on first vs repeated clicks")
+    p.add_argument("--items", type=int, default=200)
+    p.add_argument("--roberta", action="store_true")
+    p.set_defaults(func=bench_cold_warm)
+
+    p = sub.add_parser("sampling", help="Representative sampling time for prompt building")
+    p.add_argument("--items", type=int, default=50000)
+    p.add_argument("--token-budget", type=int, default=1500)
+    p.set_defaults(func=bench_sampling)
+
+    p = sub.add_parser("hedging", help="Tail latency of simulated LLM calls with and without hedging")
+    p.add_argument("--calls", type=int, default=300)
+    p.add_argument("--tail-rate", type=float, default=0.03)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_hedging)
+
+    p = sub.add_parser("import-time", help="Cold import time of the apps and library modules")
+    p.add_argument("--modules", nargs="+", default=[
+        "analyzer", "report_generator", "batch_report", "app", "post_event", "pre_event_content_gen"
+    ])
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_import_time)
+
+    p = sub.add_parser("onnx-compare", help="Int8 ONNX vs PyTorch RoBERTa: speed and label agreement")
+    p.add_argument("--items", type=int, default=1000)
+    p.add_argument("--batch-size", type=int, default=32)
+    p.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    p.set_defaults(func=bench_onnx_compare)
+
+    p = sub.add_parser("cascade", help="Full RoBERTa vs lexicon-first cascade sentiment scoring")
+    p.add_argument("--items", type=int, default=2000)
+    p.add_argument("--onnx", action="store_true", help="use the ONNX backend for RoBERTa")
+    p.set_defaults(func=bench_cascade)
+
+    p = sub.add_parser("lexicon-parallel", help="Multi-process VADER + TextBlob scoring throughput")
+    p.add_argument("--items", type=int, default=100000)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.set_defaults(func=bench_lexicon_parallel)
+
+    p = sub.add_parser("sentiment-memory", help="Memory of per-item sentiment results, dicts vs columnar")
+    p.add_argument("--items", type=int, default=100000)
+    p.set_defaults(func=bench_sentiment_memory)
+
+    p = sub.add_parser("dedup", help="Near-duplicate collapsing: dedup ratio, sentiment time and prompt tokens")
+    p.add_argument("--items", type=int, default=20000)
+    p.add_argument("--unique-share", type=float, default=0.2, help="share of genuinely distinct answers")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_dedup)
+
+    p = sub.add_parser("sentiment-cache", help="Repeat events with and without the persistent sentiment cache")
+    p.add_argument("--items", type=int, default=20000)
+    p.add_argument("--events", type=int, default=3)
+    p.set_defaults(func=bench_sentiment_cache)
+
+    p = sub.add_parser("text-analysis", help="Joined-text vs streaming word and phrase statistics")
+    p.add_argument("--items", type=int, default=200000)
+    p.set_defaults(func=bench_text_analysis)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
-import matplotlib.pyplot as plt
 from io import BytesIO
 
+def get_pyplot():
+    # matplotlib takes most of a second to import, so wait until a chart is drawn
+    import matplotlib.pyplot as plt
+    return plt
+
 def create_sentiment_chart(sentiment_data):
+    plt = get_pyplot()
     labels = list(sentiment_data.keys())
     sizes = list(sentiment_data.values())
     colors = ['#4CAF50', '#FFC107', '#F44336']
@@ -18,6 +23,7 @@ def create_sentiment_chart(sentiment_data):
     return buf
 
 def create_attendance_chart(students, faculty, guests):
+    plt = get_pyplot()
     labels = ['Students', 'Faculty', 'Guests']
     sizes = [students, faculty, guests]
     colors = ['#66b3ff','#99ff99','#ffcc99']
@@ -34,6 +40,7 @@ def create_attendance_chart(students, faculty, guests):
     return buf
 
 def create_word_frequency_chart(word_freq_data):
+    plt = get_pyplot()
     words, frequencies = zip(*word_freq_data)
     plt.figure(figsize=(10, 6))
     plt.barh(words, frequencies, color='#2196F3')
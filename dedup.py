@@ -0,0 +1,243 @@
+"""
+Near-duplicate collapsing of feedback.
+
+Survey exports repeat the same answer many times ("Great session!!", "great
+session", "Great sesion"). Responses are grouped in two steps:
+
+1. exact: identical after the caller's normalization (case, punctuation, whitespace);
+2. near: MinHash signatures of trigrams, banded LSH to find candidate pairs, then
+   an exact check. A response joins an earlier group's representative when their
+   trigram Jaccard similarity is at least ``min_similarity`` and every word that
+   differs is a spelling variant of the other side's word or a filler word, so
+   "good" vs "not good" or "helpful" vs "unhelpful" never merge.
+
+Signatures are computed in NumPy and candidates whose MinHash estimate is far
+below ``min_similarity`` skip the exact check. The Python-side candidate work is
+still what costs, so the near step has a budget of ``NEAR_CHECK_BUDGET``
+candidates plus ``CHECKS_PER_MERGE`` for every merge it finds: on answers that
+share a template but differ in substance it gives up after a bounded amount of
+work, while real typo variants keep earning more.
+
+MinHash is used rather than SimHash because feedback is short: with a dozen
+trigrams one typo flips many SimHash bits, while MinHash estimates the Jaccard
+similarity directly. Callers score each group once and weight by its count.
+"""
+import difflib
+import functools
+import time
+
+import numpy as np
+
+NUM_PERM = 32
+BANDS = 8
+MIN_NEAR_CHARS = 12  # shorter answers only collapse on exact matches
+MAX_BUCKET = 64      # leaders kept per LSH bucket, so near-identical templates cannot go quadratic
+MAX_CHECKS = 8       # candidates given the exact check, best MinHash estimate first
+ESTIMATE_SLACK = 0.25     # candidates estimated this far below min_similarity skip the exact check
+NEAR_CHECK_BUDGET = 4000  # candidates the near step may look at before its first merge...
+CHECKS_PER_MERGE = 50     # ...plus this many for each merge it finds
+FILLER_WORDS = {"a", "an", "the", "and", "so", "very", "really", "overall", "just", "too"}
+_CHUNK = 2048
+
+
+class DuplicateGroups:
+    """Which group each response belongs to, with one representative and a count per group"""
+
+    def __init__(self, group_of, representatives, keys, exact_of, seconds=0.0, near_checked=True):
+        self.group_of = group_of                # group id per response
+        self.representatives = representatives  # response index of each group's first member
+        self.keys = keys                        # normalized text of each representative
+        self.exact_of = exact_of                # id of the exact-match group per response
+        self.counts = np.bincount(np.asarray(group_of, dtype=np.int64), minlength=len(representatives)).tolist()
+        distinct = len(set(exact_of))
+        self.exact_duplicates = len(exact_of) - distinct
+        self.near_duplicates = distinct - len(representatives)
+        self.seconds = seconds
+        self.near_checked = near_checked        # False when the near step was off or ran out of budget
+
+    def __len__(self):
+        return len(self.group_of)
+
+    def unique(self, texts):
+        """One text per group, in first-seen order"""
+        return [texts[i] for i in self.representatives]
+
+    def with_counts(self, texts):
+        """Unique texts for prompts, suffixed with "(xN)" when N responses gave that answer"""
+        return [text if count == 1 else f"{text} (x{count})"
+                for text, count in zip(self.unique(texts), self.counts)]
+
+    def item_keys(self):
+        """The representative's normalized text for every response"""
+        return [self.keys[g] for g in self.group_of]
+
+    def subset(self, indices):
+        """Groups restricted to the responses at ``indices``, renumbered in first-seen order"""
+        renumber = {}
+        group_of, representatives, keys = [], [], []
+        for position, idx in enumerate(indices):
+            old = self.group_of[idx]
+            if old not in renumber:
+                renumber[old] = len(representatives)
+                representatives.append(position)
+                keys.append(self.keys[old])
+            group_of.append(renumber[old])
+        return DuplicateGroups(group_of, representatives, keys, [self.exact_of[idx] for idx in indices],
+                               seconds=self.seconds, near_checked=self.near_checked)
+
+    def stats(self):
+        responses = len(self.group_of)
+        return {
+            "responses": responses,
+            "unique": len(self.representatives),
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "dedup_ratio": 1 - len(self.representatives) / responses if responses else 0.0,
+            "near_checked": self.near_checked,
+            "seconds": self.seconds,
+        }
+
+
+# ========== GROUPING ========== #
+def group_duplicates(texts, normalize, near=True, min_similarity=0.85):
+    """Group texts that are equal after ``normalize`` and, when ``near``, near-duplicates of each other"""
+    start = time.perf_counter()
+    key_group = {}
+    exact_of, keys = [], []
+    for text in texts:
+        key = normalize(text)
+        group = key_group.get(key)
+        if group is None:
+            group = key_group[key] = len(keys)
+            keys.append(key)
+        exact_of.append(group)
+
+    # Map each exact group to the exact group that leads its near-duplicate cluster
+    leader, near_checked = near_duplicate_leaders(keys, min_similarity) if near else (list(range(len(keys))), False)
+    renumber = {}
+    group_of, representatives, rep_keys = [], [], []
+    first_item = {}
+    for idx, exact in enumerate(exact_of):
+        first_item.setdefault(exact, idx)
+        lead = leader[exact]
+        if lead not in renumber:
+            renumber[lead] = len(representatives)
+            representatives.append(first_item.setdefault(lead, idx))
+            rep_keys.append(keys[lead])
+        group_of.append(renumber[lead])
+
+    return DuplicateGroups(group_of, representatives, rep_keys, exact_of,
+                           seconds=time.perf_counter() - start, near_checked=near_checked)
+
+
+def shingles(key):
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def minhash_signatures(keys, num_perm=NUM_PERM, seed=0):
+    """(n x num_perm) MinHash signatures of the byte trigrams of each padded key, computed in NumPy"""
+    rng = np.random.default_rng(seed)
+    # Multiply-shift hashing: wrapping 64-bit arithmetic, the top 32 bits are the hash
+    a = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(keys), num_perm), dtype=np.uint64)
+    for start in range(0, len(keys), _CHUNK):
+        encoded = [f" {key} ".encode("utf-8") for key in keys[start:start + _CHUNK]]
+        data = np.frombuffer(b"".join(encoded) + b"\0\0", dtype=np.uint8).astype(np.uint64)
+        ends = np.cumsum([len(e) for e in encoded])
+        # A trigram starts at every byte but the last two of each key; its id is its three bytes
+        starts = np.ones(ends[-1], dtype=bool)
+        starts[ends - 1] = starts[ends - 2] = False
+        ids = ((data[:-2] << 16) | (data[1:-1] << 8) | data[2:])[starts]
+        offsets = np.concatenate(([0], ends[:-1] - 2 * np.arange(1, len(encoded))))
+        hashed = (ids[:, None] * a + b) >> np.uint64(32)
+        signatures[start:start + len(encoded)] = np.minimum.reduceat(hashed, offsets, axis=0)
+    return signatures
+
+
+def near_duplicate_leaders(keys, min_similarity=0.85, bands=BANDS):
+    """For each key, the index of the earlier key it duplicates (itself if none), and
+    whether every key was checked.
+
+    Only leaders are candidates, so every member is similar to the text that
+    actually gets scored rather than chained through intermediate variants.
+    Once the candidates run past their budget the remaining keys are left as
+    their own leaders.
+    """
+    leader = list(range(len(keys)))
+    eligible = [i for i, key in enumerate(keys) if len(key) >= MIN_NEAR_CHARS]
+    if len(eligible) < 2:
+        return leader, True
+    # Signatures are filled in a block at a time, so a pass that runs out of budget stops paying for them
+    signatures = np.empty((len(eligible), NUM_PERM), dtype=np.uint64)
+    rows = NUM_PERM // bands
+    weights = np.random.default_rng(1).integers(1, 1 << 63, size=rows, dtype=np.uint64)
+    shingle_sets = {}  # built on first use: most keys never reach the exact check
+
+    def shingle_set(position):
+        if position not in shingle_sets:
+            shingle_sets[position] = shingles(keys[eligible[position]])
+        return shingle_sets[position]
+
+    buckets = [{} for _ in range(bands)]
+    checks = merges = 0
+    for position, idx in enumerate(eligible):
+        if checks >= NEAR_CHECK_BUDGET + CHECKS_PER_MERGE * merges:
+            return leader, False
+        if position % _CHUNK == 0:
+            block = signatures[position:position + _CHUNK]
+            block[:] = minhash_signatures([keys[i] for i in eligible[position:position + _CHUNK]])
+            # One 64-bit hash per band (wrapping arithmetic), converted to Python ints in one go
+            band_hashes = (block.reshape(len(block), bands, rows) * weights).sum(axis=2).tolist()
+        band_keys = band_hashes[position % _CHUNK]
+        candidates = set()
+        for band, band_key in enumerate(band_keys):
+            candidates.update(buckets[band].get(band_key, ()))
+        if candidates:
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            estimate = (signatures[candidates] == signatures[position]).mean(axis=1)
+            # With 32 permutations the estimate is within about 0.06 of the true similarity
+            order = np.argsort(-estimate, kind="stable")[:MAX_CHECKS]
+            checks += len(order)  # the budget counts candidates, checked or not
+            order = order[estimate[order] >= min_similarity - ESTIMATE_SLACK]
+            own = shingle_set(position)
+            for other in candidates[order].tolist():
+                if (jaccard(own, shingle_set(other)) >= min_similarity
+                        and same_words_modulo_typos(keys[idx], keys[eligible[other]])):
+                    leader[idx] = eligible[other]
+                    merges += 1
+                    break
+        if leader[idx] == idx:
+            # A new leader: only leaders are stored in the buckets
+            for band, band_key in enumerate(band_keys):
+                bucket = buckets[band].setdefault(band_key, [])
+                if len(bucket) < MAX_BUCKET:
+                    bucket.append(position)
+    return leader, True
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+def same_words_modulo_typos(a, b):
+    """True when the words that differ between ``a`` and ``b`` are fillers or spelling variants"""
+    words_a, words_b = set(a.split()), set(b.split())
+    only_a = [w for w in words_a - words_b if w not in FILLER_WORDS]
+    only_b = [w for w in words_b - words_a if w not in FILLER_WORDS]
+    return all(any(is_spelling_variant(w, v) for v in only_b) for w in only_a) and \
+        all(any(is_spelling_variant(w, v) for v in only_a) for w in only_b)
+
+
+@functools.lru_cache(maxsize=65536)
+def is_spelling_variant(a, b):
+    # Same first letter keeps negating prefixes apart ("helpful"/"unhelpful", "like"/"dislike");
+    # numbers are never typos of each other ("day 1"/"day 2")
+    if a[0] != b[0] or a.isdigit() or b.isdigit():
+        return False
+    matcher = difflib.SequenceMatcher(None, a, b)
+    return matcher.real_quick_ratio() >= 0.8 and matcher.ratio() >= 0.8
@@ -0,0 +1,61 @@
+"""
+Diagnostics sink for the non-UI modules.
+
+analyzer.py reports recoverable problems (a failed LLM call, a model that would
+not load) through emit() instead of calling Streamlit, so it imports without a UI
+and works the same from worker threads, process pools and the batch CLI.
+Every message goes to the standard logging module. It also goes to the sink passed
+with it, e.g. a Collector the Streamlit app renders once the work is done, and
+to any process-wide subscribers.
+"""
+import logging
+import threading
+
+logger = logging.getLogger("event_report")
+
+_LOG_LEVELS = {"info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+_subscribers = []
+_subscribers_lock = threading.Lock()
+
+
+class Collector:
+    """Sink that keeps (level, message) pairs in order; safe to call from worker threads"""
+
+    def __init__(self):
+        self.messages = []
+
+    def __call__(self, level, message):
+        self.messages.append((level, message))  # list.append is atomic
+
+    def __iter__(self):
+        return iter(list(self.messages))
+
+    def __len__(self):
+        return len(self.messages)
+
+
+def subscribe(callback):
+    """Send every message in this process to ``callback(level, message)``"""
+    with _subscribers_lock:
+        _subscribers.append(callback)
+    return callback
+
+
+def unsubscribe(callback):
+    with _subscribers_lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+
+def emit(level, message, sink=None):
+    """Report ``message`` at ``level`` ("info", "warning" or "error"). Sinks never raise into the caller."""
+    logger.log(_LOG_LEVELS.get(level, logging.INFO), message)
+    with _subscribers_lock:
+        targets = list(_subscribers)
+    if sink is not None:
+        targets.insert(0, sink)
+    for target in targets:
+        try:
+            target(level, message)
+        except Exception:
+            logger.exception("Diagnostics sink failed")
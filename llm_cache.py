@@ -0,0 +1,121 @@
+"""
+Persistent, content-addressed cache for LLM completions.
+
+A completion is keyed by a SHA-256 of the model, the full message list and the
+sampling parameters, so re-running a report only pays for prompts that actually
+changed. Entries live in a small SQLite file shared by every app and process.
+
+Environment:
+    LLM_CACHE_PATH         location of the SQLite file
+    LLM_CACHE_DISABLED=1   bypass the cache entirely
+    LLM_CACHE_TTL          seconds before an entry expires (default 7 days)
+    LLM_CACHE_MAX_ENTRIES  entries kept before least-recently-used ones are evicted
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "llm_cache.sqlite3")
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+
+class CompletionCache:
+    def __init__(self, path=DEFAULT_PATH, ttl_seconds=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, enabled=True):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, "
+                "created REAL, last_used REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON completions(last_used)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(model, messages, params):
+        payload = json.dumps({"model": model, "messages": messages, "params": params},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for ``key`` or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT response, created FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                self.misses += 1
+                return None
+            conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model, response, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn, now):
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM completions WHERE created < ?", (now - self.ttl_seconds,))
+        if self.max_entries:
+            conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM completions")
+            conn.commit()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            entries = self._connect().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache configured from the environment."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CompletionCache(
+                path=os.getenv("LLM_CACHE_PATH", DEFAULT_PATH),
+                ttl_seconds=float(os.getenv("LLM_CACHE_TTL", DEFAULT_TTL)),
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                enabled=os.getenv("LLM_CACHE_DISABLED", "").lower() not in ("1", "true", "yes"),
+            )
+        return _cache
+
@@ -0,0 +1,330 @@
+"""
+Single entry point for every LLM completion in the apps.
+
+complete() looks the prompt up in the persistent cache, and on a miss sends it
+through the shared rate-limit scheduler (with per-stage deadlines) to a backend.
+Backends are pooled per process, so HTTP keep-alive and TLS sessions are reused
+across calls, reruns and Streamlit sessions. Usage and latency are accounted the
+same way whichever backend answered.
+
+Each stage is routed to a model tier: cheap classification and formatting stages
+run on a small fast model, the narrative stages keep the large one.
+
+Environment:
+    LLM_BACKEND=stub       answer every prompt locally (offline testing, no API key needed)
+    GROQ_BASE_URL          point the Groq backend at another server, e.g. the stub server
+    LLM_MODEL_FAST         model for the fast tier (default llama3-8b-8192)
+    LLM_MODEL_LARGE        model for the large tier (default llama3-70b-8192)
+    LLM_STAGE_TIERS        per-stage overrides, e.g. "relevance=large,chunk_summary=fast"
+    LLM_SPOT_CHECK_RATE    fraction of fast-tier answers re-asked on the large tier for comparison
+
+Run a local OpenAI-compatible stub server with:
+    python llm_gateway.py --serve-stub --port 8765
+    GROQ_BASE_URL=http://127.0.0.1:8765 streamlit run app.py
+"""
+import concurrent.futures
+import difflib
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from llm_cache import get_cache
+from llm_scheduler import call_with_deadline, get_scheduler
+
+
+# ========== BACKENDS ========== #
+class LLMBackend:
+    """Interface: ``complete`` returns ``(text, usage)`` where usage has prompt/completion token counts."""
+    name = "base"
+    # Remote backends share the Groq request/token budget; local ones answer immediately
+    rate_limited = True
+
+    def complete(self, model, messages, timeout=None, **params):
+        raise NotImplementedError
+
+
+class GroqBackend(LLMBackend):
+    name = "groq"
+
+    def __init__(self, api_key, base_url=None):
+        from groq import Groq
+        # Retries are handled by llm_scheduler so the client does not double them up
+        self.client = Groq(api_key=api_key, base_url=base_url, max_retries=0)
+
+    def complete(self, model, messages, timeout=None, **params):
+        response = self.client.chat.completions.create(model=model, messages=messages, timeout=timeout, **params)
+        usage = getattr(response, "usage", None)
+        return response.choices[0].message.content, {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        }
+
+
+_NUMBERED_LINE_RE = re.compile(r"^\d+\. ", re.MULTILINE)
+
+
+class StubBackend(LLMBackend):
+    """Deterministic offline answers shaped like the real prompts expect."""
+    name = "stub"
+    rate_limited = False
+
+    def complete(self, model, messages, timeout=None, **params):
+        prompt = messages[-1]["content"]
+        if (params.get("response_format") or {}).get("type") == "json_object":
+            text = json.dumps({
+                "key_themes": [{"title": "Stub Theme", "description": "Offline placeholder theme.", "sentiment": "Neutral"}],
+                "suggestions": [{"heading": "Stub Suggestions", "recommendations": ["Run against Groq for real output."]}],
+                "narrative_summary": "Offline stub summary of the event feedback.",
+                "key_takeaways": {
+                    "key_wins": [{"theme": "Stub Win", "summary": "Placeholder win."}],
+                    "next_steps": [{"theme": "Stub Step", "action": "Placeholder action."}],
+                },
+            })
+        elif "comma-separated list of 1/0" in prompt:
+            text = ",".join("1" for _ in _NUMBERED_LINE_RE.findall(prompt))
+        else:
+            text = f"**Stub Response**\nOffline placeholder for a {len(prompt)}-character prompt."
+        return text, {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4}
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(api_key=None):
+    """Pooled backend for ``api_key`` (None when no key is configured and the stub is not enabled)."""
+    if os.getenv("LLM_BACKEND", "").lower() == "stub":
+        key = "stub"
+    elif api_key:
+        key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    else:
+        return None
+
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = StubBackend() if key == "stub" else GroqBackend(api_key, base_url=os.getenv("GROQ_BASE_URL") or None)
+        return _backends[key]
+
+
+# ========== USAGE ACCOUNTING ========== #
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+def _record_usage(stage, backend, model, usage=None, seconds=0.0, cached=False):
+    with _usage_lock:
+        entry = _usage.setdefault(stage, {
+            "calls": 0, "cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_seconds": 0.0,
+            "backend": backend, "model": model
+        })
+        if cached:
+            entry["cache_hits"] += 1
+            return
+        entry["calls"] += 1
+        entry["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        entry["completion_tokens"] += usage.get("completion_tokens", 0)
+        entry["latency_seconds"] += seconds
+
+
+def usage_stats():
+    """Per-stage calls, cache hits, tokens and total latency since the process started."""
+    with _usage_lock:
+        return {stage: dict(entry) for stage, entry in _usage.items()}
+
+
+# ========== MODEL ROUTING ========== #
+MODEL_TIERS = {
+    "fast": os.getenv("LLM_MODEL_FAST", "llama3-8b-8192"),
+    "large": os.getenv("LLM_MODEL_LARGE", "llama3-70b-8192"),
+}
+# Stages not listed here run on the large tier
+STAGE_TIERS = {
+    "relevance": "fast",
+    "boldify": "fast",
+    "mentions": "fast",
+    "tweet_draft": "fast",
+}
+
+
+def _parse_stage_tiers(spec):
+    overrides = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        stage, _, tier = item.partition("=")
+        if tier.strip() in MODEL_TIERS:
+            overrides[stage.strip()] = tier.strip()
+    return overrides
+
+
+STAGE_TIERS.update(_parse_stage_tiers(os.getenv("LLM_STAGE_TIERS", "")))
+
+
+def tier_for(stage, tier=None):
+    """Tier for ``stage``; an explicit ``tier`` (e.g. "large" to pin everything) wins over the table."""
+    return tier if tier in MODEL_TIERS else STAGE_TIERS.get(stage, "large")
+
+
+def model_for(stage, tier=None):
+    return MODEL_TIERS[tier_for(stage, tier)]
+
+
+# ========== SPOT CHECKS ========== #
+SPOT_CHECK_RATE = float(os.getenv("LLM_SPOT_CHECK_RATE", 0))
+_spot_checks = []
+_spot_check_stats = {}
+_spot_check_lock = threading.Lock()
+_spot_check_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="llm-spot-check")
+
+
+def add_spot_check(hook):
+    """Register ``hook(backend, stage, model, messages, content, params)``, called for sampled fast-tier answers.
+
+    Hooks run in the background and may return a score in [0, 1] (1 = acceptable);
+    scores are averaged per stage in spot_check_stats().
+    """
+    with _spot_check_lock:
+        _spot_checks.append(hook)
+
+
+def spot_check_stats():
+    with _spot_check_lock:
+        return {
+            stage: dict(entry, mean_score=entry["score_total"] / entry["scored"] if entry["scored"] else None)
+            for stage, entry in _spot_check_stats.items()
+        }
+
+
+def _run_spot_checks(backend, stage, model, messages, content, params):
+    with _spot_check_lock:
+        hooks = list(_spot_checks)
+    for hook in hooks:
+        try:
+            score = hook(backend, stage, model, messages, content, params)
+        except Exception:
+            score = None
+        with _spot_check_lock:
+            entry = _spot_check_stats.setdefault(stage, {"checked": 0, "scored": 0, "score_total": 0.0})
+            entry["checked"] += 1
+            if score is not None:
+                entry["scored"] += 1
+                entry["score_total"] += float(score)
+
+
+def large_tier_agreement(backend, stage, model, messages, content, params):
+    """Default spot check: re-ask the large tier and score how closely the fast answer matches it."""
+    reference = complete(backend, messages=messages, stage=f"{stage}_spot_check", tier="large", **params)
+    return difflib.SequenceMatcher(None, content.strip(), reference.strip()).ratio()
+
+
+if SPOT_CHECK_RATE > 0:
+    add_spot_check(large_tier_agreement)
+
+
+# ========== COMPLETIONS ========== #
+# Typical completion length per stage, reserved against the TPM budget when a call sets no
+# max_tokens; the reservation is settled against the usage Groq reports once the call returns
+STAGE_COMPLETION_TOKENS = {
+    "chunk_summary": 200,
+    "key_themes": 400,
+    "suggestions": 400,
+    "key_takeaways": 250,
+    "narrative_summary": 300,
+    "analysis_bundle": 1000,
+    "professionalize": 200,
+    "mentions": 200,
+    "tweet_draft": 100,
+}
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+def complete(backend, model=None, messages=None, use_cache=True, stage="default", tier=None, **params):
+    """Return the completion text for ``messages``, from the cache or from ``backend``.
+
+    ``stage`` selects the model tier (unless ``model`` or ``tier`` is given), the deadline
+    (see llm_scheduler.STAGE_DEADLINES) and the usage bucket; it is not part of the cache key.
+    """
+    tier = tier_for(stage, tier)
+    model = model or MODEL_TIERS[tier]
+    cache = get_cache()
+    use_cache = use_cache and cache.enabled
+    if use_cache:
+        key = cache.make_key(model, messages, params)
+        content = cache.get(key)
+        if content is not None:
+            _record_usage(stage, backend.name if backend else "none", model, cached=True)
+            return content
+
+    if backend is None:
+        raise RuntimeError("No LLM backend configured")
+
+    # Budget for the prompt plus a typical completion; Groq counts both against the TPM limit
+    estimated_tokens = sum(len(m.get("content") or "") for m in messages) // 4 + params.get(
+        "max_tokens", STAGE_COMPLETION_TOKENS.get(stage, DEFAULT_COMPLETION_TOKENS))
+    start = time.monotonic()
+    if backend.rate_limited:
+        # Groq's limits are per model, so each model queues against its own budget
+        scheduler = get_scheduler(model, tier)
+        content, usage = call_with_deadline(
+            lambda timeout: backend.complete(model, messages, timeout=timeout, **params),
+            stage=stage,
+            estimated_tokens=estimated_tokens,
+            scheduler=scheduler
+        )
+        scheduler.settle(estimated_tokens, usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0))
+    else:
+        content, usage = backend.complete(model, messages, **params)
+    _record_usage(stage, backend.name, model, usage, time.monotonic() - start)
+
+    if use_cache:
+        cache.put(key, model, content)
+    if model != MODEL_TIERS["large"] and _spot_checks and random.random() < SPOT_CHECK_RATE:
+        _spot_check_pool.submit(_run_spot_checks, backend, stage, model, messages, content, params)
+    return content
+
+
+# ========== STUB SERVER ========== #
+def serve_stub(host="127.0.0.1", port=8765):
+    """OpenAI-compatible chat completions endpoint backed by StubBackend."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    stub = StubBackend()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            params = {k: v for k, v in body.items() if k not in ("model", "messages")}
+            text, usage = stub.complete(body.get("model"), body.get("messages", []), **params)
+            payload = json.dumps({
+                "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": dict(usage, total_tokens=sum(usage.values())),
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Stub LLM server listening on http://{host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="LLM gateway utilities")
+    parser.add_argument("--serve-stub", action="store_true", help="run the offline stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    if args.serve_stub:
+        serve_stub(args.host, args.port)
+    else:
+        parser.print_help()
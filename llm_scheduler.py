@@ -0,0 +1,462 @@
+"""
+Rate-limit-aware scheduler shared by every LLM call in the process.
+
+Requests wait for both a requests-per-minute and a tokens-per-minute budget
+before they are sent, so a burst of concurrent calls queues locally instead of
+triggering 429s. Throttled or transient failures are retried with jittered
+exponential backoff, honouring the server's Retry-After header, and a 429 pauses
+every caller briefly rather than letting them all hammer the API.
+
+Every call also runs against a per-stage deadline, counted from when the request
+is first sent, and can optionally be hedged: once a call has been outstanding
+longer than that stage's observed p95 latency, a duplicate is sent and whichever
+answers first wins. Time spent queued for our own rate budget only counts
+against LLM_QUEUE_LIMIT, when one is set.
+
+Groq limits each model separately, so every model gets its own budget: the fast
+tier's classification calls never spend what the large tier's narrative stages
+are queued for.
+
+Environment:
+    GROQ_RPM          requests per minute (default 30)
+    GROQ_TPM          tokens per minute (default 6000)
+    GROQ_RPM_<TIER>   per-tier override, e.g. GROQ_RPM_FAST; likewise GROQ_TPM_<TIER>
+    GROQ_MAX_RETRIES  retries per request (default 5)
+    LLM_DEADLINE      default per-call deadline in seconds (default 60)
+    LLM_QUEUE_LIMIT   seconds a call may wait for rate budget before it fails (default 0, no limit)
+    LLM_HEDGE=1       enable hedged duplicate requests
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import random
+import threading
+import time
+from collections import deque
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout"}
+
+
+class TokenBucket:
+    """Continuously refilling budget of ``capacity`` units per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until ``amount`` units are available (0 if they are available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.available >= amount else (amount - self.available) / self.rate
+
+    def take(self, amount):
+        self.available -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        """Return units that were reserved but not used"""
+        self.available = min(self.capacity, self.available + amount)
+
+
+class SharedTokenBucket(TokenBucket):
+    """TokenBucket kept in shared memory so several worker processes draw from one budget.
+
+    ``state`` is a multiprocessing Array of [available, updated]; pass it to workers
+    through the pool initializer.
+    """
+
+    def __init__(self, per_minute, state=None):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.state = state if state is not None else multiprocessing.Array("d", [float(per_minute), time.monotonic()])
+
+    @property
+    def available(self):
+        return self.state[0]
+
+    @available.setter
+    def available(self, value):
+        self.state[0] = value
+
+    @property
+    def updated(self):
+        return self.state[1]
+
+    @updated.setter
+    def updated(self, value):
+        self.state[1] = value
+
+    def wait_time(self, amount, now):
+        with self.state.get_lock():
+            return super().wait_time(amount, now)
+
+    def take(self, amount):
+        # Another process may have drawn since wait_time; going negative just delays the next caller
+        with self.state.get_lock():
+            super().take(amount)
+
+    def give_back(self, amount):
+        with self.state.get_lock():
+            super().give_back(amount)
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    return _status_code(error) in RETRYABLE_STATUS or type(error).__name__ in RETRYABLE_ERRORS
+
+
+class CallAbandoned(Exception):
+    """The caller gave up (deadline passed or a hedge won) before the request was sent"""
+
+
+class LLMScheduler:
+    def __init__(self, requests_per_minute=30, tokens_per_minute=6000, max_retries=5, base_delay=1.0, max_delay=30.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._paused_until = 0.0
+        self._waiting = 0
+        self._stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0, "abandoned": 0,
+                       "wait_seconds": 0.0, "tokens_returned": 0}
+
+    def _abandoned(self, cancel, expires):
+        return (cancel is not None and cancel.is_set()) or (expires is not None and time.monotonic() >= expires)
+
+    def _acquire(self, estimated_tokens, cancel=None, expires=None):
+        start = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    # A caller that gave up must not spend budget the live callers are queued for
+                    if self._abandoned(cancel, expires):
+                        self._stats["abandoned"] += 1
+                        raise CallAbandoned()
+                    now = time.monotonic()
+                    delay = max(self._paused_until - now,
+                                self.requests.wait_time(1, now),
+                                self.tokens.wait_time(estimated_tokens, now))
+                    if delay <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(estimated_tokens)
+                        break
+                    if expires is not None:
+                        delay = min(delay, max(0.0, expires - now))
+                    self._cond.wait(delay)
+            finally:
+                self._waiting -= 1
+                self._stats["wait_seconds"] += time.monotonic() - start
+
+    def _pause(self, seconds):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def settle(self, reserved_tokens, used_tokens):
+        """Correct a call's token reservation to what the server reported using.
+
+        The unused part goes back to the budget, so queued callers can start
+        sooner; an under-estimate is charged. Unknown usage (0) leaves it as is.
+        """
+        if not used_tokens:
+            return
+        with self._cond:
+            if used_tokens < reserved_tokens:
+                self.tokens.give_back(reserved_tokens - used_tokens)
+                self._stats["tokens_returned"] += reserved_tokens - used_tokens
+                self._cond.notify_all()
+            else:
+                self.tokens.take(used_tokens - reserved_tokens)
+
+    def wake(self):
+        """Let queued callers re-check their cancel events"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def call(self, fn, estimated_tokens=500, cancel=None, expires=None):
+        """Run ``fn()`` within the rate budget, retrying throttled and transient failures.
+
+        Once ``cancel`` (a threading.Event) is set or the monotonic time ``expires``
+        passes, the call stops queueing and retrying and raises CallAbandoned.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire(estimated_tokens, cancel, expires)
+            try:
+                result = fn()
+                with self._cond:
+                    self._stats["requests"] += 1
+                return result
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    with self._cond:
+                        self._stats["failures"] += 1
+                    raise
+                backoff = min(self.max_delay, self.base_delay * 2 ** attempt)
+                delay = _retry_after(e) or random.uniform(backoff / 2, backoff)
+                with self._cond:
+                    self._stats["retries"] += 1
+                    if _status_code(e) == 429:
+                        self._stats["throttled"] += 1
+                if _status_code(e) == 429:
+                    # Everyone backs off together, otherwise the queued callers just earn more 429s
+                    self._pause(delay)
+                elif cancel is not None:
+                    cancel.wait(delay)
+                else:
+                    time.sleep(delay)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queue_depth"] = self._waiting
+        completed = stats["requests"] + stats["failures"] + stats["abandoned"]
+        stats["avg_wait_seconds"] = stats["wait_seconds"] / completed if completed else 0.0
+        return stats
+
+
+_schedulers = {}  # model -> LLMScheduler; None is the default used when no model is named
+_scheduler_lock = threading.Lock()
+
+
+def rate_limits(tier=None):
+    """(requests, tokens) per minute for ``tier``: GROQ_RPM_<TIER>/GROQ_TPM_<TIER>, else GROQ_RPM/GROQ_TPM"""
+    def limit(name, default):
+        value = os.getenv(f"{name}_{tier.upper()}") if tier else None
+        return float(value or os.getenv(name, default))
+    return limit("GROQ_RPM", 30), limit("GROQ_TPM", 6000)
+
+
+def get_scheduler(model=None, tier=None):
+    """Process-wide scheduler for ``model``, with the limits of its ``tier`` on first use."""
+    with _scheduler_lock:
+        if model not in _schedulers:
+            requests_per_minute, tokens_per_minute = rate_limits(tier)
+            _schedulers[model] = LLMScheduler(
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+                max_retries=int(os.getenv("GROQ_MAX_RETRIES", 5)),
+            )
+        return _schedulers[model]
+
+
+def scheduler_stats():
+    """stats() summed over every model's scheduler"""
+    with _scheduler_lock:
+        schedulers = list(_schedulers.values())
+    total = dict.fromkeys(("requests", "retries", "throttled", "failures", "abandoned", "wait_seconds",
+                           "tokens_returned", "queue_depth"), 0)
+    for scheduler in schedulers:
+        for key, value in scheduler.stats().items():
+            if key in total:
+                total[key] += value
+    completed = total["requests"] + total["failures"] + total["abandoned"]
+    total["avg_wait_seconds"] = total["wait_seconds"] / completed if completed else 0.0
+    return total
+
+
+def make_shared_budget(models):
+    """Per-model rate budgets that worker processes can share via install_shared_budget.
+
+    ``models`` maps tier to model (as llm_gateway.MODEL_TIERS); limits come from the environment.
+    """
+    budget = {}
+    for tier, model in models.items():
+        if model not in budget:
+            requests_per_minute, tokens_per_minute = rate_limits(tier)
+            budget[model] = {
+                "requests_per_minute": requests_per_minute,
+                "tokens_per_minute": tokens_per_minute,
+                "requests": SharedTokenBucket(requests_per_minute).state,
+                "tokens": SharedTokenBucket(tokens_per_minute).state,
+            }
+    return budget
+
+
+def install_shared_budget(budget):
+    """Make this process's schedulers draw from ``budget`` (call once, e.g. in a pool initializer)."""
+    schedulers = {}
+    for model, limits in budget.items():
+        scheduler = LLMScheduler(
+            requests_per_minute=limits["requests_per_minute"],
+            tokens_per_minute=limits["tokens_per_minute"],
+            max_retries=int(os.getenv("GROQ_MAX_RETRIES", 5)),
+        )
+        scheduler.requests = SharedTokenBucket(limits["requests_per_minute"], limits["requests"])
+        scheduler.tokens = SharedTokenBucket(limits["tokens_per_minute"], limits["tokens"])
+        schedulers[model] = scheduler
+    with _scheduler_lock:
+        _schedulers.update(schedulers)
+    return schedulers
+
+
+# ========== DEADLINES & HEDGING ========== #
+DEFAULT_DEADLINE = float(os.getenv("LLM_DEADLINE", 60))
+QUEUE_LIMIT = float(os.getenv("LLM_QUEUE_LIMIT", 0))
+# Seconds a stage's call may take once its request is sent, including retries, before it falls back
+STAGE_DEADLINES = {
+    "relevance": 30,
+    "chunk_summary": 45,
+    "key_themes": 45,
+    "suggestions": 45,
+    "key_takeaways": 45,
+    "narrative_summary": 60,
+    "analysis_bundle": 90,
+    "boldify": 20,
+    "professionalize": 20,
+    "mentions": 20,
+    "post_draft": 60,
+    "tweet_draft": 30,
+    "post_refine": 45,
+    "pre_event_post": 60,
+}
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "").lower() in ("1", "true", "yes")
+HEDGE_MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per stage."""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, stage, pct, min_samples=1):
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))]
+
+    def summary(self):
+        with self._lock:
+            counts = {stage: len(samples) for stage, samples in self._samples.items()}
+        return {
+            stage: {
+                "count": count,
+                "p50": self.percentile(stage, 50),
+                "p95": self.percentile(stage, 95),
+                "p99": self.percentile(stage, 99),
+            }
+            for stage, count in counts.items()
+        }
+
+
+latency_tracker = LatencyTracker()
+_hedge_stats = {"hedged": 0, "hedge_wins": 0, "deadline_misses": 0, "queue_timeouts": 0}
+_hedge_lock = threading.Lock()
+_call_pool = concurrent.futures.ThreadPoolExecutor(max_workers=64, thread_name_prefix="llm-call")
+
+
+def deadline_for(stage):
+    return STAGE_DEADLINES.get(stage, DEFAULT_DEADLINE)
+
+
+def _count(key):
+    with _hedge_lock:
+        _hedge_stats[key] += 1
+
+
+def hedge_stats():
+    with _hedge_lock:
+        return dict(_hedge_stats)
+
+
+def call_with_deadline(fn, stage="default", estimated_tokens=500, hedge=None, scheduler=None):
+    """Run ``fn(timeout)`` through the scheduler within the stage deadline.
+
+    The deadline starts when the first request is sent, so a call queued behind our
+    own rate budget is not failed for it; only a Groq that is slow to answer is.
+    ``timeout`` is the time left before the deadline, for use as the HTTP timeout so
+    an abandoned attempt does not outlive it. Raises TimeoutError once the deadline
+    (or QUEUE_LIMIT, while still queued) passes; callers already turn exceptions
+    into their fallback text. ``scheduler`` defaults to get_scheduler().
+    """
+    scheduler = scheduler or get_scheduler()
+    deadline = deadline_for(stage)
+    cancel = threading.Event()
+    sent = concurrent.futures.Future()  # resolves to the monotonic time the first request went out
+    sent_lock = threading.Lock()
+
+    def send():
+        with sent_lock:
+            if not sent.done():
+                sent.set_result(time.monotonic())
+        return fn(max(1.0, sent.result() + deadline - time.monotonic()))
+
+    def attempt():
+        return scheduler.call(send, estimated_tokens, cancel=cancel)
+
+    futures = [_call_pool.submit(attempt)]
+    hedge_after = None
+    if HEDGE_ENABLED if hedge is None else hedge:
+        hedge_after = latency_tracker.percentile(stage, 95, min_samples=HEDGE_MIN_SAMPLES)
+
+    try:
+        done, _ = concurrent.futures.wait([futures[0], sent], timeout=QUEUE_LIMIT or None,
+                                          return_when=concurrent.futures.FIRST_COMPLETED)
+        if not done:
+            _count("queue_timeouts")
+            raise TimeoutError(f"{stage} call waited over {QUEUE_LIMIT:.0f}s for rate budget")
+        # Without a send the attempt failed before reaching Groq; the loop below re-raises it
+        sent_at = sent.result() if sent.done() else time.monotonic()
+        expires = sent_at + deadline
+
+        if hedge_after is not None and hedge_after < deadline:
+            done, _ = concurrent.futures.wait(futures, timeout=max(0.0, sent_at + hedge_after - time.monotonic()))
+            if not done:
+                futures.append(_call_pool.submit(attempt))
+                _count("hedged")
+
+        pending, error = set(futures), None
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, timeout=max(0.0, expires - time.monotonic()),
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            if not done:
+                _count("deadline_misses")
+                raise TimeoutError(f"{stage} call exceeded its {deadline:.0f}s deadline")
+            for future in done:
+                if future.exception() is None:
+                    latency_tracker.record(stage, time.monotonic() - sent_at)
+                    if future is not futures[0]:
+                        _count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+    finally:
+        # Losers and timed-out attempts stop queueing for budget and retrying; a request
+        # already on the wire ends at its HTTP timeout
+        cancel.set()
+        scheduler.wake()
+        for future in futures:
+            future.cancel()
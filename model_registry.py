@@ -0,0 +1,148 @@
+"""
+Process-wide registry for heavy NLP resources.
+
+Every Streamlit session runs in the same Python process, so models loaded here
+are shared by all sessions and reruns. Each resource is keyed by its name and
+options and loaded at most once, even when several sessions ask for it at the
+same time.
+
+Heavy libraries (nltk, transformers, torch) are imported inside the loaders, so
+importing this module is free and nothing is loaded until a resource is needed.
+NLTK data is never downloaded at runtime; provision it once with
+``python -m nltk.downloader vader_lexicon``.
+"""
+import os
+import threading
+import time
+
+ROBERTA_MODEL = "cardiffnlp/twitter-roberta-base-sentiment"
+SUMMARIZER_MODEL = "sshleifer/distilbart-cnn-12-6"
+VADER_LEXICON = "sentiment/vader_lexicon.zip/vader_lexicon/vader_lexicon.txt"
+
+_resources = {}
+_key_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _make_key(name, options):
+    return (name, tuple(sorted(options.items())))
+
+
+def get_resource(name, loader, **options):
+    """Return the cached resource for ``name``/``options``, calling ``loader(**options)`` on first use."""
+    key = _make_key(name, options)
+    resource = _resources.get(key)
+    if resource is not None:
+        return resource
+
+    with _registry_lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        # Another session may have finished loading while we waited for the lock
+        if key not in _resources:
+            _resources[key] = loader(**options)
+        return _resources[key]
+
+
+def evict(name=None):
+    """Drop cached resources (all of them, or every variant of ``name``). Returns the number evicted."""
+    with _registry_lock:
+        keys = [k for k in _resources if name is None or k[0] == name]
+        for key in keys:
+            del _resources[key]
+            _key_locks.pop(key, None)
+    return len(keys)
+
+
+def loaded_resources():
+    """Names and options of the resources currently held in memory."""
+    return [(name, dict(options)) for name, options in list(_resources)]
+
+
+# ========== LOADERS ========== #
+def _load_sentiment_pipeline(model, top_k=None):
+    from transformers import pipeline
+    return pipeline("sentiment-analysis", model=model, top_k=top_k)
+
+
+def _load_onnx_sentiment(model_dir=None, threads=None):
+    from onnx_sentiment import OnnxSentimentPipeline
+    return OnnxSentimentPipeline(model_dir=model_dir, threads=threads)
+
+
+def _load_summarizer(model):
+    from transformers import pipeline
+    return pipeline("summarization", model=model)
+
+
+def find_vader_lexicon():
+    """Location of the VADER lexicon without touching the network.
+
+    Looks in the NLTK data path first, then for the copy bundled with the
+    vaderSentiment package. Raises LookupError with setup instructions if neither exists.
+    """
+    import nltk
+
+    try:
+        nltk.data.find(VADER_LEXICON)
+        return VADER_LEXICON
+    except LookupError:
+        pass
+    try:
+        import vaderSentiment
+        bundled = os.path.join(os.path.dirname(vaderSentiment.__file__), "vader_lexicon.txt")
+        if os.path.exists(bundled):
+            return "file:" + bundled
+    except ImportError:
+        pass
+    raise LookupError(
+        "VADER lexicon not found. Install it once with 'python -m nltk.downloader vader_lexicon' "
+        "(or set NLTK_DATA to a directory that contains it)."
+    )
+
+
+def _load_textblob():
+    from textblob.en.sentiments import PatternAnalyzer
+    return PatternAnalyzer()
+
+
+def _load_vader():
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer(lexicon_file=find_vader_lexicon())
+
+
+def get_sentiment_pipeline(model=ROBERTA_MODEL, top_k=None):
+    return get_resource("sentiment-pipeline", _load_sentiment_pipeline, model=model, top_k=top_k)
+
+
+def get_onnx_sentiment(model_dir=None, threads=None):
+    """Int8 ONNX Runtime RoBERTa with the same call signature and labels as get_sentiment_pipeline()"""
+    threads = threads or (int(os.getenv("ONNX_THREADS")) if os.getenv("ONNX_THREADS") else None)
+    return get_resource("onnx-sentiment", _load_onnx_sentiment, model_dir=model_dir, threads=threads)
+
+
+def get_vader_analyzer():
+    return get_resource("vader", _load_vader)
+
+
+def get_textblob_analyzer():
+    """TextBlob's default PatternAnalyzer; ``analyze(text).polarity`` equals ``TextBlob(text).sentiment.polarity``"""
+    return get_resource("textblob", _load_textblob)
+
+
+def get_summarizer(model=SUMMARIZER_MODEL):
+    return get_resource("summarizer", _load_summarizer, model=model)
+
+
+def warm_up(use_roberta=False, roberta_backend="pytorch"):
+    """Load the resources an analysis will need ahead of the first click. Returns load time per resource."""
+    timings = {}
+    start = time.perf_counter()
+    get_vader_analyzer()
+    get_textblob_analyzer()
+    timings["vader"] = time.perf_counter() - start
+    if use_roberta:
+        start = time.perf_counter()
+        get_onnx_sentiment() if roberta_backend == "onnx" else get_sentiment_pipeline()
+        timings["roberta"] = time.perf_counter() - start
+    return timings
@@ -0,0 +1,121 @@
+"""
+Int8-quantized ONNX Runtime version of the RoBERTa sentiment model for CPU-only servers.
+
+Export and quantize once (needs torch, transformers and onnxruntime):
+    python onnx_sentiment.py export
+
+then choose the ONNX runtime for RoBERTa in the app (or pass
+roberta_backend="onnx" to FeedbackAnalyzer). Inference only needs onnxruntime,
+numpy and the tokenizer saved next to the model, and returns the same
+LABEL_0/1/2 scores as the transformers pipeline.
+
+Environment:
+    ONNX_MODEL_DIR   where the exported model lives (default .cache/onnx/<model>-int8)
+    ONNX_THREADS     intra-op threads per session (default: onnxruntime decides)
+"""
+import json
+import os
+
+import numpy as np
+
+import model_registry
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "onnx")
+
+
+def model_dir_for(model=model_registry.ROBERTA_MODEL):
+    return os.getenv("ONNX_MODEL_DIR") or os.path.join(DEFAULT_ROOT, model.split("/")[-1] + "-int8")
+
+
+def export_quantized(model=model_registry.ROBERTA_MODEL, out_dir=None, opset=14):
+    """Export ``model`` to ONNX, quantize its weights to int8 and save it with its tokenizer. Returns the directory."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    out_dir = out_dir or model_dir_for(model)
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model)
+    network = AutoModelForSequenceClassification.from_pretrained(model).eval()
+
+    sample = tokenizer(["An example sentence for tracing."], return_tensors="pt")
+    fp32_path = os.path.join(out_dir, "model-fp32.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            network, (sample["input_ids"], sample["attention_mask"]), fp32_path,
+            input_names=["input_ids", "attention_mask"], output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=opset,
+        )
+    # Dynamic quantization: int8 weights, activations quantized on the fly; no calibration set needed
+    quantize_dynamic(fp32_path, os.path.join(out_dir, "model.onnx"), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    tokenizer.save_pretrained(out_dir)
+    network.config.save_pretrained(out_dir)
+    return out_dir
+
+
+class OnnxSentimentPipeline:
+    """Drop-in for ``pipeline("sentiment-analysis", top_k=None)``: one list of label scores per text."""
+
+    def __init__(self, model_dir=None, threads=None, max_length=512):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = model_dir or model_dir_for()
+        model_path = os.path.join(model_dir, "model.onnx")
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_path} not found; run 'python onnx_sentiment.py export' first")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = int(threads)
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_length = max_length
+
+        with open(os.path.join(model_dir, "config.json"), encoding="utf-8") as f:
+            id2label = json.load(f).get("id2label", {})
+        n_labels = self.session.get_outputs()[0].shape[-1]
+        n_labels = n_labels if isinstance(n_labels, int) else len(id2label)
+        self.labels = [id2label.get(str(i), f"LABEL_{i}") for i in range(n_labels)]
+
+    def __call__(self, texts, batch_size=32, truncation=True, max_length=None):
+        if isinstance(texts, str):
+            texts = [texts]
+        max_length = max_length or self.max_length
+        results = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                list(texts[start:start + batch_size]), padding=True, truncation=truncation,
+                max_length=max_length, return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            logits = self.session.run(None, feeds)[0]
+            logits = logits - logits.max(axis=1, keepdims=True)
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=1, keepdims=True)
+            results.extend(
+                [{"label": label, "score": float(score)} for label, score in zip(self.labels, row)]
+                for row in probs
+            )
+        return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ONNX sentiment model utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("export", help="export and int8-quantize the RoBERTa sentiment model")
+    p.add_argument("--model", default=model_registry.ROBERTA_MODEL)
+    p.add_argument("--out", default=None)
+    args = parser.parse_args()
+    print(f"Saved quantized model to {export_quantized(args.model, args.out)}")
@@ -0,0 +1,90 @@
+"""
+Multi-process VADER + TextBlob scoring for very large feedback sets.
+
+The lexicon scorers are pure Python and hold the GIL, so threads do not help.
+Feedback is cut into shards that are scored across a process pool, and each worker
+keeps its own VADER and TextBlob analyzers from model_registry. Scores come back in
+input order, so the caller's counting, percentages and overall_score are unchanged.
+
+Environment:
+    LEXICON_WORKERS   worker processes (default: one per CPU)
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+
+import model_registry
+
+SHARDS_PER_WORKER = 4
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def default_workers():
+    return int(os.getenv("LEXICON_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def _init_worker():
+    # Load both analyzers before the first shard arrives
+    model_registry.get_vader_analyzer()
+    model_registry.get_textblob_analyzer()
+
+
+def score_shard(texts):
+    """(VADER compound, TextBlob polarity) for each text, using this process's analyzers"""
+    vader = model_registry.get_vader_analyzer()
+    pattern = model_registry.get_textblob_analyzer()
+    return [(vader.polarity_scores(text)['compound'], pattern.analyze(text).polarity) for text in texts]
+
+
+def get_pool(workers):
+    """Process-wide pool, rebuilt only when the worker count changes"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn, not fork: the Streamlit server is multi-threaded and forking it can deadlock
+            _pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+            )
+            _pool_workers = workers
+        return _pool
+
+
+def _discard(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def score_lexicon(feedback_list, workers=None):
+    """Lexicon scores for every item, in order, computed across ``workers`` processes"""
+    workers = workers or default_workers()
+    if workers <= 1 or len(feedback_list) < workers:
+        return score_shard(feedback_list)
+    shard_size = -(-len(feedback_list) // (workers * SHARDS_PER_WORKER))
+    shards = [feedback_list[i:i + shard_size] for i in range(0, len(feedback_list), shard_size)]
+    pool = get_pool(workers)
+    scores = []
+    try:
+        for shard_scores in pool.map(score_shard, shards):
+            scores.extend(shard_scores)
+    except concurrent.futures.BrokenExecutor:
+        # A crashed worker poisons the pool; drop it so the next call starts a fresh one
+        _discard(pool)
+        raise
+    return scores
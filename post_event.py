@@ -1,5 +1,5 @@
 import streamlit as st
-from groq import Groq
+from llm_gateway import complete as llm_complete, get_backend
 from docx import Document
 import io
 import fitz  # PyMuPDF
@@ -179,21 +179,23 @@ Tweet MUST include:
     return prompt
 
 # ========== GROQ API & REFINEMENT PROCESS ========== #
-def call_groq_api_with_refinement(api_key, initial_prompt, platform):
+def call_groq_api_with_refinement(api_key, initial_prompt, platform, use_cache=True):
     """
     Generates a post in a two-step process: first a draft, then a refinement.
     """
     try:
-        client = Groq(api_key=api_key)
+        backend = get_backend(api_key)
         
         # Step 1: Generate the initial draft
-        draft_completion = client.chat.completions.create(
-            model="llama3-70b-8192",
+        draft_post = llm_complete(
+            backend,
             messages=[{"role": "user", "content": initial_prompt}],
+            # Tweets go out as drafted, so the short Twitter draft can run on the fast tier
+            stage="tweet_draft" if platform == "Twitter" else "post_draft",
+            use_cache=use_cache,
             temperature=0.7,
             top_p=0.9
-        )
-        draft_post = draft_completion.choices[0].message.content.strip()
+        ).strip()
 
         if platform == "Twitter":
             return draft_post[:TWITTER_CHAR_LIMIT]
@@ -218,12 +220,13 @@ Return only the final, polished post.
 Generated post will directly be posted so ensure it is polished, professional, and engaging and in the event organizers prespective.
 """
         
-        refined_completion = client.chat.completions.create(
-            model="llama3-70b-8192",
+        return llm_complete(
+            backend,
             messages=[{"role": "user", "content": refinement_prompt}],
+            stage="post_refine",
+            use_cache=use_cache,
             temperature=0.5,
-        )
-        return refined_completion.choices[0].message.content.strip()
+        ).strip()
 
     except Exception as e:
         st.error(f"An error occurred with the Groq API: {e}")
@@ -240,6 +243,8 @@ with st.sidebar:
     st.markdown("---")
     st.header("📄 Upload Report")
     uploaded_file = st.file_uploader("Upload Report (DOCX or PDF)", type=['docx', 'pdf'])
+    st.markdown("---")
+    fresh_drafts = st.checkbox("Generate fresh drafts (skip cached responses)", value=False)
 
 if not uploaded_file:
     st.info("Please upload your event report in the sidebar to get started.")
@@ -283,10 +288,11 @@ if submit:
         results = {}
         
         with st.spinner("🤖 Generating and refining professional social media content..."):
-            results["LinkedIn"] = call_groq_api_with_refinement(api_key, build_linkedin_post_event_prompt(data, report_content), "LinkedIn")
-            results["Instagram"] = call_groq_api_with_refinement(api_key, build_instagram_whatsapp_prompt("Instagram", data, report_content), "Instagram")
-            results["WhatsApp"] = call_groq_api_with_refinement(api_key, build_instagram_whatsapp_prompt("WhatsApp", data, report_content), "WhatsApp")
-            results["Twitter"] = call_groq_api_with_refinement(api_key, build_twitter_prompt(data, report_content), "Twitter")
+            use_cache = not fresh_drafts
+            results["LinkedIn"] = call_groq_api_with_refinement(api_key, build_linkedin_post_event_prompt(data, report_content), "LinkedIn", use_cache)
+            results["Instagram"] = call_groq_api_with_refinement(api_key, build_instagram_whatsapp_prompt("Instagram", data, report_content), "Instagram", use_cache)
+            results["WhatsApp"] = call_groq_api_with_refinement(api_key, build_instagram_whatsapp_prompt("WhatsApp", data, report_content), "WhatsApp", use_cache)
+            results["Twitter"] = call_groq_api_with_refinement(api_key, build_twitter_prompt(data, report_content), "Twitter", use_cache)
 
         if any(results.values()):
             st.success("🎉 Content generated successfully!")
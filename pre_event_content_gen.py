@@ -1,7 +1,6 @@
 import streamlit as st
-from groq import Groq
-import torch
-from transformers import pipeline
+from llm_gateway import complete as llm_complete, get_backend
+import model_registry
 import textwrap
 
 # ========== CONFIG ========== #
@@ -11,9 +10,9 @@ PREDEFINED_HASHTAGS = [
 ]
 
 # ========== ROBERTA SUMMARIZER ========== #
-@st.cache_resource(show_spinner=False)
 def load_summarizer():
-    return pipeline("summarization", model="sshleifer/distilbart-cnn-12-6")
+    # transformers/torch are only imported the first time a summary is requested
+    return model_registry.get_summarizer()
 
 def roberta_summarize(text, max_len=130):
     summarizer = load_summarizer()
@@ -145,14 +144,16 @@ Keep it short, punchy, and include:
     return prompt
 
 # ========== GROQ API CALL ========== #
-def call_groq_api(api_key, prompt):
-    client = Groq(api_key=api_key)
-    completion = client.chat.completions.create(
-        model="llama3-70b-8192",
+def call_groq_api(api_key, prompt, use_cache=True):
+    backend = get_backend(api_key)
+    completion = llm_complete(
+        backend,
         messages=[{"role": "user", "content": prompt}],
+        stage="pre_event_post",
+        use_cache=use_cache,
         temperature=0.7
     )
-    return completion.choices[0].message.content.strip()
+    return completion.strip()
 
 # ========== STREAMLIT UI ========== #
 st.set_page_config(page_title="PASC Content Generator", layout="centered", page_icon="🚀")
@@ -166,6 +167,7 @@ api_key = st.text_input("🔑 Groq API Key", type="password", help="Enter your G
 
 # RoBERTa Option
 use_roberta = st.checkbox("Use RoBERTa summarization for Overview", value=True, help="Summarize long overviews using RoBERTa model")
+fresh_drafts = st.checkbox("Generate fresh drafts", value=False, help="Skip previously cached responses for identical prompts")
 
 st.header("📋 Enter Event Details")
 
@@ -224,7 +226,7 @@ if submit:
             for platform_name, prompt_builder in platforms.items():
                 try:
                     prompt = prompt_builder(data, use_roberta)
-                    result = call_groq_api(api_key, prompt)
+                    result = call_groq_api(api_key, prompt, use_cache=not fresh_drafts)
                     
                     # Special handling for Twitter character limit
                     if platform_name == "Twitter" and len(result) > TWITTER_CHAR_LIMIT:
@@ -0,0 +1,119 @@
+"""
+Diversity-aware sampling of feedback for LLM prompts.
+
+Instead of sending the first N responses, feedback is vectorized with hashed
+TF-IDF features, grouped with spherical k-means, and each cluster contributes
+representatives in proportion to its size until the token budget is filled.
+Everything is plain NumPy so it stays well under a second for 50k responses.
+"""
+import re
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def _estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def vectorize(feedback_list, n_features=256):
+    """L2-normalized hashed TF-IDF matrix (n_items x n_features, float32)"""
+    seen = {}
+    tokenized = [seen[text] if text in seen else seen.setdefault(text, _TOKEN_RE.findall(text.lower()))
+                 for text in feedback_list]
+    counts = np.fromiter(map(len, tokenized), dtype=np.int64, count=len(tokenized))
+    flat = [token for tokens in tokenized for token in tokens]
+    # Vocabulary ids in first-seen order keep the features deterministic across processes
+    vocab = {token: i for i, token in enumerate(dict.fromkeys(flat))}
+    cols = np.fromiter(map(vocab.__getitem__, flat), dtype=np.int64, count=len(flat)) % n_features
+    rows = np.repeat(np.arange(len(feedback_list)), counts)
+
+    matrix = np.bincount(rows * n_features + cols, minlength=len(feedback_list) * n_features)
+    matrix = matrix.astype(np.float32).reshape(len(feedback_list), n_features)
+    doc_freq = np.count_nonzero(matrix, axis=0)
+    matrix *= (np.log((1 + len(feedback_list)) / (1 + doc_freq)) + 1).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def spherical_kmeans(matrix, n_clusters, n_iter=10, seed=0, fit_sample=4096):
+    """Cluster unit vectors by cosine similarity. Returns (labels, similarity to own centroid).
+
+    Centroids are fitted on at most ``fit_sample`` rows; every row is then assigned
+    in a single pass, which keeps large inputs cheap.
+    """
+    rng = np.random.default_rng(seed)
+    full_matrix = matrix
+    if matrix.shape[0] > fit_sample:
+        matrix = matrix[np.sort(rng.choice(matrix.shape[0], fit_sample, replace=False))]
+    n_items = matrix.shape[0]
+
+    # k-means++ style seeding on cosine distance
+    centroids = [matrix[rng.integers(n_items)]]
+    best_sim = matrix @ centroids[0]
+    for _ in range(1, n_clusters):
+        distance = np.clip(1.0 - best_sim, 0, None)
+        total = distance.sum()
+        idx = rng.choice(n_items, p=distance / total) if total > 0 else rng.integers(n_items)
+        centroids.append(matrix[idx])
+        best_sim = np.maximum(best_sim, matrix @ matrix[idx])
+    centroids = np.vstack(centroids)
+
+    for _ in range(n_iter):
+        similarity = matrix @ centroids.T
+        labels = similarity.argmax(axis=1)
+        assignment = np.zeros((n_clusters, n_items), dtype=matrix.dtype)
+        assignment[labels, np.arange(n_items)] = 1.0
+        new_centroids = assignment @ matrix
+        norms = np.linalg.norm(new_centroids, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        new_centroids[empty] = centroids[empty]
+        norms[empty] = 1.0
+        new_centroids /= norms
+        if np.allclose(new_centroids, centroids):
+            break
+        centroids = new_centroids
+
+    similarity = full_matrix @ centroids.T
+    labels = similarity.argmax(axis=1)
+    return labels, similarity[np.arange(full_matrix.shape[0]), labels]
+
+
+def select_representatives(feedback_list, token_budget=1500, n_clusters=None, seed=0, weights=None):
+    """Pick a diverse subset of feedback that fits ``token_budget``, returned in original order.
+
+    Each cluster gets a share of the budget proportional to its size (at least one
+    item), filled with the members closest to its centroid. ``weights`` counts how
+    many responses each item stands for when duplicates were collapsed.
+    """
+    tokens = np.fromiter((_estimate_tokens(fb) for fb in feedback_list), dtype=np.int64, count=len(feedback_list))
+    if tokens.sum() <= token_budget:
+        return list(feedback_list)
+
+    if n_clusters is None:
+        # Roughly as many clusters as items that fit the budget, capped to keep k-means cheap
+        n_clusters = int(np.clip(token_budget // max(1, int(np.median(tokens))) // 3, 2, 32))
+    n_clusters = min(n_clusters, len(feedback_list))
+
+    labels, closeness = spherical_kmeans(vectorize(feedback_list), n_clusters, seed=seed)
+    sizes = np.bincount(labels, weights=weights, minlength=n_clusters)
+    quotas = token_budget * sizes / sizes.sum()
+
+    chosen = []
+    spent = 0
+    # Largest clusters first so the budget goes to the dominant opinions before the long tail
+    for cluster in np.argsort(-sizes, kind="stable"):
+        if sizes[cluster] == 0:
+            continue
+        members = np.flatnonzero(labels == cluster)
+        members = members[np.argsort(-closeness[members], kind="stable")]
+        cluster_spent = 0
+        for idx in members:
+            cost = int(tokens[idx])
+            if spent + cost > token_budget or (cluster_spent and cluster_spent + cost > quotas[cluster]):
+                continue
+            chosen.append(idx)
+            cluster_spent += cost
+            spent += cost
+    return [feedback_list[i] for i in sorted(chosen)]
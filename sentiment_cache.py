@@ -0,0 +1,159 @@
+"""
+Persistent cache of per-text sentiment scores, shared across runs and events.
+
+The same short answers ("very informative", "good", "could be better") come back
+event after event. Scores are stored in a small SQLite file keyed by a SHA-256 of
+the scorer (name plus library or model version) and the text, so a repeated
+phrase skips VADER/TextBlob and the RoBERTa forward pass entirely. Only
+whitespace is normalized: case and punctuation change VADER and RoBERTa scores,
+so "GREAT!!" and "great" are cached separately. Lookups and inserts are done in
+bulk, and least-recently-used entries are evicted past ``max_entries``.
+
+Environment:
+    SENTIMENT_CACHE_PATH          location of the SQLite file
+    SENTIMENT_CACHE_DISABLED=1    bypass the cache entirely
+    SENTIMENT_CACHE_MAX_ENTRIES   entries kept before least-recently-used ones are evicted
+"""
+import functools
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sentiment_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = 200000
+SCHEMA_VERSION = 1  # bump when the stored value format changes
+_BATCH = 500  # keys per SELECT, under SQLite's bound-parameter limit
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=None)
+def _package_version(name):
+    from importlib import metadata
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "none"
+
+
+def lexicon_scorer():
+    """Scorer id for VADER compound + TextBlob polarity pairs"""
+    return f"lexicon:nltk={_package_version('nltk')}:textblob={_package_version('textblob')}"
+
+
+def roberta_scorer(model, backend):
+    """Scorer id for RoBERTa top labels; the int8 ONNX export scores slightly differently from PyTorch"""
+    return f"roberta:{model}:{backend}"
+
+
+class SentimentCache:
+    def __init__(self, path=DEFAULT_PATH, max_entries=DEFAULT_MAX_ENTRIES, enabled=True):
+        self.path = path
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sentiments ("
+                "key TEXT PRIMARY KEY, scorer TEXT, value TEXT, "
+                "created REAL, last_used REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sentiments_last_used ON sentiments(last_used)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(scorer, text):
+        normalized = _WHITESPACE_RE.sub(" ", text).strip()
+        payload = f"{SCHEMA_VERSION}\0{scorer}\0{normalized}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, scorer, texts):
+        """Cached values for ``texts`` as {position: value}; positions without an entry are left out"""
+        if not self.enabled or not texts:
+            return {}
+        keys = [self.make_key(scorer, text) for text in texts]
+        found = {}
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), _BATCH):
+                batch = unique_keys[start:start + _BATCH]
+                rows = conn.execute(
+                    f"SELECT key, value FROM sentiments WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                conn.executemany("UPDATE sentiments SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                conn.commit()
+            values = {idx: json.loads(found[key]) for idx, key in enumerate(keys) if key in found}
+            self.hits += len(values)
+            self.misses += len(keys) - len(values)
+        return values
+
+    def put_many(self, scorer, items):
+        """Store (text, value) pairs; values must be JSON-serializable"""
+        if not self.enabled:
+            return
+        now = time.time()
+        rows = [(self.make_key(scorer, text), scorer, json.dumps(value), now, now) for text, value in items]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO sentiments (key, scorer, value, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn):
+        if self.max_entries:
+            conn.execute(
+                "DELETE FROM sentiments WHERE key IN ("
+                "SELECT key FROM sentiments ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM sentiments")
+            conn.commit()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            entries = self._connect().execute("SELECT COUNT(*) FROM sentiments").fetchone()[0]
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_sentiment_cache():
+    """Process-wide cache configured from the environment."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SentimentCache(
+                path=os.getenv("SENTIMENT_CACHE_PATH", DEFAULT_PATH),
+                max_entries=int(os.getenv("SENTIMENT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                enabled=os.getenv("SENTIMENT_CACHE_DISABLED", "").lower() not in ("1", "true", "yes"),
+            )
+        return _cache
@@ -0,0 +1,130 @@
+"""
+Columnar per-item sentiment results.
+
+The analysis used to keep two parallel lists of dicts (``scores`` and
+``detailed_analysis``) with two dicts and several boxed floats per response.
+SentimentResults keeps one reference to each feedback text plus a few NumPy
+columns: label codes, RoBERTa label and score, and the lexicon scores. The old
+``scores`` and ``detailed_analysis`` lists are still available as read-only views
+that build their dicts on demand, so existing readers keep working.
+"""
+from collections.abc import Sequence
+
+import numpy as np
+
+SENTIMENTS = ("negative", "neutral", "positive")
+SENTIMENT_CODES = {label: code for code, label in enumerate(SENTIMENTS)}
+ROBERTA_LABELS = ("LABEL_0", "LABEL_1", "LABEL_2")
+ROBERTA_CODES = {label: code for code, label in enumerate(ROBERTA_LABELS)}
+COLUMNS = ("sentiment", "roberta_label", "roberta_score", "vader_compound", "textblob_polarity")
+
+
+class SentimentResults:
+    def __init__(self, texts):
+        n = len(texts)
+        self.texts = texts
+        self.sentiment = np.full(n, SENTIMENT_CODES["neutral"], dtype=np.int8)
+        self.roberta_label = np.full(n, -1, dtype=np.int8)  # -1: scored by the lexicon pair
+        self.roberta_score = np.full(n, np.nan)
+        self.vader_compound = np.full(n, np.nan)
+        self.textblob_polarity = np.full(n, np.nan)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __eq__(self, other):
+        """Same texts and the same value in every column (unset scores are NaN on both sides)"""
+        if not isinstance(other, SentimentResults):
+            return NotImplemented
+        if list(self.texts) != list(other.texts):
+            return False
+        for name in COLUMNS:
+            mine, theirs = getattr(self, name), getattr(other, name)
+            if not np.array_equal(mine, theirs, equal_nan=np.issubdtype(mine.dtype, np.floating)):
+                return False
+        return True
+
+    __hash__ = None
+
+    def set_roberta(self, idx, label, score, sentiment):
+        self.roberta_label[idx] = ROBERTA_CODES.get(label, ROBERTA_CODES["LABEL_1"])
+        self.roberta_score[idx] = score
+        self.sentiment[idx] = SENTIMENT_CODES[sentiment]
+
+    def set_lexicon(self, idx, compound, polarity, sentiment):
+        self.vader_compound[idx] = compound
+        self.textblob_polarity[idx] = polarity
+        self.sentiment[idx] = SENTIMENT_CODES[sentiment]
+
+    def counts(self):
+        counts = np.bincount(self.sentiment, minlength=len(SENTIMENTS))
+        return {label: int(counts[code]) for code, label in enumerate(SENTIMENTS)}
+
+    # ========== RECORDS ========== #
+    def score_record(self, idx):
+        """The dict the old ``scores`` list held for item ``idx``"""
+        sentiment = SENTIMENTS[self.sentiment[idx]]
+        if self.roberta_label[idx] >= 0:
+            return {
+                "text": self.texts[idx],
+                "roberta_label": ROBERTA_LABELS[self.roberta_label[idx]],
+                "roberta_score": float(self.roberta_score[idx]),
+                "sentiment": sentiment
+            }
+        return {
+            "text": self.texts[idx],
+            "vader_compound": float(self.vader_compound[idx]),
+            "textblob_polarity": float(self.textblob_polarity[idx]),
+            "sentiment": sentiment
+        }
+
+    def detail_record(self, idx):
+        """The dict the old ``detailed_analysis`` list held for item ``idx``"""
+        if self.roberta_label[idx] >= 0:
+            confidence = float(self.roberta_score[idx])
+        else:
+            confidence = abs(float(self.vader_compound[idx]))
+        return {"feedback": self.texts[idx], "sentiment": SENTIMENTS[self.sentiment[idx]], "confidence": confidence}
+
+    def page(self, start, size, sentiment=None):
+        """(index, detail record) pairs for one page, optionally only items with ``sentiment``"""
+        if sentiment is None:
+            indices = range(start, min(start + size, len(self)))
+        else:
+            indices = self.indices(sentiment)[start:start + size]
+        return [(int(idx), self.detail_record(idx)) for idx in indices]
+
+    def indices(self, sentiment):
+        return np.flatnonzero(self.sentiment == SENTIMENT_CODES[sentiment])
+
+    @property
+    def scores(self):
+        return RecordView(self, "score_record")
+
+    @property
+    def detailed_analysis(self):
+        return RecordView(self, "detail_record")
+
+
+class RecordView(Sequence):
+    """Read-only list of records built on access; slicing returns a plain list"""
+
+    def __init__(self, store, method):
+        self.store = store
+        self.method = method
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, idx):
+        record = getattr(self.store, self.method)
+        if isinstance(idx, slice):
+            return [record(i) for i in range(*idx.indices(len(self.store)))]
+        if idx < 0:
+            idx += len(self.store)
+        if not 0 <= idx < len(self.store):
+            raise IndexError("record index out of range")
+        return record(idx)
+
+    def __eq__(self, other):
+        return isinstance(other, Sequence) and len(self) == len(other) and all(a == b for a, b in zip(self, other))